@@ -1,7 +1,10 @@
-import docx
 import re
 import json
 import os
+import argparse
+
+from docx_stream import read_paragraph_texts
+from stage_metrics import metrics, add_instrumentation_arguments, instrumented
 
 def extract_unit_resources(doc_path):
     """Extract resources from DOCX file by unit."""
@@ -12,10 +15,11 @@ def extract_unit_resources(doc_path):
     
     try:
         # Open the document
-        doc = docx.Document(doc_path)
+        with metrics.stage('load'):
+            paragraph_texts = read_paragraph_texts(doc_path)
         
         # Extract text
-        full_text = "\n".join([para.text for para in doc.paragraphs])
+        full_text = "\n".join(paragraph_texts)
         
         # Find unit sections
         unit_pattern = r'VISUAL 1 - UNIT (\d+) - (.+?)(?=VISUAL 1 - UNIT \d+|\Z)'
@@ -28,8 +32,8 @@ def extract_unit_resources(doc_path):
             current_unit = ""
             current_unit_num = None
             
-            for para in doc.paragraphs:
-                text = para.text.strip()
+            for paragraph_text in paragraph_texts:
+                text = paragraph_text.strip()
                 if "VISUAL 1 - UNIT" in text:
                     # If we were building a unit, save it
                     if current_unit_num:
@@ -123,17 +127,17 @@ def print_resource_table(resource_data):
     print("\nDETAILED RESOURCES FOR CODE GENERATION:")
     print("=" * 100)
     
+    # Get full text from docx file
+    full_text = "\n".join(read_paragraph_texts('downloaded_document.docx'))
+    
     for unit_num in sorted(resource_data.keys(), key=lambda x: int(x) if x.isdigit() else 999):
         unit = resource_data[unit_num]
         print(f"\nUNIT {unit_num}:")
         
-        # Get full text for this unit from docx file
-        with open('downloaded_document.docx', 'rb') as docx_file:
-            doc = docx.Document(docx_file)
-            full_text = "\n".join([para.text for para in doc.paragraphs])
-            unit_pattern = f'VISUAL 1 - UNIT {unit_num} - (.+?)(?=VISUAL 1 - UNIT \d+|\Z)'
-            unit_match = re.search(unit_pattern, full_text, re.DOTALL)
-            unit_content = unit_match.group(0) if unit_match else ""
+        # Get full text for this unit
+        unit_pattern = f'VISUAL 1 - UNIT {unit_num} - (.+?)(?=VISUAL 1 - UNIT \d+|\Z)'
+        unit_match = re.search(unit_pattern, full_text, re.DOTALL)
+        unit_content = unit_match.group(0) if unit_match else ""
         
         # Extract and print all iframe codes
         iframe_pattern = r'<iframe.+?</iframe>'
@@ -223,12 +227,23 @@ def compare_with_implementation(resource_data):
     print("=" * 95)
 
 def main():
+    parser = argparse.ArgumentParser(description='Inventory the resources in downloaded_document.docx.')
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+    
+    with instrumented(args.timings, args.profile):
+        run()
+
+def run():
     doc_path = 'downloaded_document.docx'
-    resource_data = extract_unit_resources(doc_path)
+    with metrics.stage('extract'):
+        resource_data = extract_unit_resources(doc_path)
     
     if resource_data:
-        print_resource_table(resource_data)
-        compare_with_implementation(resource_data)
+        metrics.increment('units', len(resource_data))
+        with metrics.stage('report'):
+            print_resource_table(resource_data)
+            compare_with_implementation(resource_data)
         
         # Save detailed data as JSON
         with open('resource_inventory.json', 'w') as json_file:
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the ESL filename-to-question pipeline
+
+This script builds synthetic image filename corpora from the question patterns in
+attached_assets/All_Book_*_Unique_Question_Patterns.csv, scales them to the requested
+sizes and measures the throughput of each stage of ESLQuestionGenerator:
+clean_filename, format_question and determine_question_type, plus the batch path
+(build_question_records_bulk) over the same names.
+
+Usage:
+  # Run the default sizes (10k, 100k and 1M names) and print a summary table
+  python benchmark_question_pipeline.py
+
+  # Store results as JSON for comparison between revisions
+  python benchmark_question_pipeline.py --output bench-main.json
+
+  # Compare against a previous run
+  python benchmark_question_pipeline.py --sizes 100000 --output bench-new.json --compare bench-main.json
+"""
+
+import os
+import csv
+import glob
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Callable, Optional
+
+from s3_question_generator import ESLQuestionGenerator
+
+# Question pattern sources
+PATTERN_GLOB = os.path.join('attached_assets', 'All_Book_*_Unique_Question_Patterns.csv')
+
+# Default corpus sizes
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Allocation tracking slows the interpreter down a lot, so it runs on a sample
+ALLOCATION_SAMPLE_SIZE = 100_000
+
+# Filename prefix styles seen in the bucket: "01_A_", "01_AB_", "05 C B " and none
+PREFIX_STYLES = ['{num:02d}_{a}_', '{num:02d}_{a}{b}_', '{num:02d} {a} {b} ', '']
+EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.webp']
+
+
+def load_question_patterns(pattern_glob: str = PATTERN_GLOB) -> List[str]:
+    """Load the unique question texts from the pattern CSV files."""
+    questions = []
+    for path in sorted(glob.glob(pattern_glob)):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                # Book 1 and 4 use "Question", Book 7 uses "pattern"
+                text = (row.get('Question') or row.get('pattern') or '').strip().strip('"').strip()
+                if text and text.lower() != 'nan':
+                    questions.append(text)
+    return questions
+
+
+def build_filename_corpus(questions: List[str], size: int, seed: int = 0) -> List[str]:
+    """Build `size` synthetic image filenames from the question patterns."""
+    rng = random.Random(seed)
+    letters = 'ABCDEFGHIJ'
+    filenames = []
+    for _ in range(size):
+        question = rng.choice(questions).rstrip('?')
+        prefix = rng.choice(PREFIX_STYLES).format(num=rng.randint(0, 99), a=rng.choice(letters), b=rng.choice(letters))
+        separator = rng.choice([' ', '_', '-'])
+        filenames.append(prefix + separator.join(question.split()) + rng.choice(EXTENSIONS))
+    return filenames
+
+
+def measure_stage(func: Callable[[Any], Any], inputs: List[Any], track_allocations: bool) -> Dict[str, Any]:
+    """Run func over every input and return its timing (and optionally allocation) figures."""
+    start = time.perf_counter()
+    outputs = [func(item) for item in inputs]
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'names': len(inputs),
+        'seconds': round(elapsed, 6),
+        'names_per_sec': round(len(inputs) / elapsed, 1) if elapsed else None,
+        'outputs': outputs
+    }
+
+    if track_allocations:
+        sample = inputs[:ALLOCATION_SAMPLE_SIZE]
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        sample_outputs = [func(item) for item in sample]
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del sample_outputs
+        result['alloc_sample'] = len(sample)
+        result['alloc_peak_bytes'] = peak - before
+        result['alloc_bytes_per_name'] = round((after - before) / len(sample), 1) if sample else None
+
+    return result
+
+
+def measure_bulk(generator: ESLQuestionGenerator, filenames: List[str]) -> Dict[str, Any]:
+    """Time build_question_records_bulk over the names in BULK_BATCH_SIZE batches, like a bucket run."""
+    batch_size = generator.BULK_BATCH_SIZE
+    start = time.perf_counter()
+    for offset in range(0, len(filenames), batch_size):
+        generator.build_question_records_bulk(filenames[offset:offset + batch_size])
+    elapsed = time.perf_counter() - start
+    return {
+        'names': len(filenames),
+        'seconds': round(elapsed, 6),
+        'names_per_sec': round(len(filenames) / elapsed, 1) if elapsed else None
+    }
+
+
+def run_benchmark(sizes: List[int], seed: int, track_allocations: bool) -> List[Dict[str, Any]]:
+    """Benchmark each pipeline stage at each corpus size."""
+    generator = ESLQuestionGenerator()
+    questions = load_question_patterns()
+    if not questions:
+        raise SystemExit(f"No question patterns found in {PATTERN_GLOB}")
+
+    results = []
+    for size in sizes:
+        filenames = build_filename_corpus(questions, size, seed)
+
+        # Each stage consumes the previous stage's output, like process_s3_file does
+        clean = measure_stage(generator.clean_filename, filenames, track_allocations)
+        formatted = measure_stage(generator.format_question, clean.pop('outputs'), track_allocations)
+        classified = measure_stage(generator.determine_question_type, formatted.pop('outputs'), track_allocations)
+        classified.pop('outputs')
+
+        total_seconds = clean['seconds'] + formatted['seconds'] + classified['seconds']
+        for stage, figures in (('clean_filename', clean), ('format_question', formatted),
+                               ('determine_question_type', classified)):
+            results.append({'size': size, 'stage': stage, **figures})
+        results.append({
+            'size': size,
+            'stage': 'pipeline',
+            'names': size,
+            'seconds': round(total_seconds, 6),
+            'names_per_sec': round(size / total_seconds, 1) if total_seconds else None
+        })
+        results.append({'size': size, 'stage': 'bulk_pipeline', **measure_bulk(generator, filenames)})
+
+    return results
+
+
+def current_revision() -> Optional[str]:
+    """Return the current git revision, if available."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """Print a summary table, with the speedup against a baseline run if given."""
+    baseline_rates = {}
+    if baseline:
+        baseline_rates = {(r['size'], r['stage']): r.get('names_per_sec') for r in baseline['results']}
+
+    print(f"{'SIZE':>10}  {'STAGE':<25}{'NAMES/SEC':>14}{'BYTES/NAME':>12}{'VS BASELINE':>13}")
+    print("-" * 76)
+    for r in results:
+        bytes_per_name = r.get('alloc_bytes_per_name')
+        bytes_column = f"{bytes_per_name:>12.1f}" if bytes_per_name is not None else f"{'-':>12}"
+        base_rate = baseline_rates.get((r['size'], r['stage']))
+        speedup = f"{r['names_per_sec'] / base_rate:>12.2f}x" if base_rate and r['names_per_sec'] else f"{'-':>13}"
+        print(f"{r['size']:>10}  {r['stage']:<25}{r['names_per_sec'] or 0:>14,.0f}{bytes_column}{speedup}")
+
+
+def main():
+    """Main entry point of the script."""
+    parser = argparse.ArgumentParser(description='Benchmark the filename-to-question pipeline.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Corpus sizes to benchmark (default: 10000 100000 1000000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic corpus')
+    parser.add_argument('--no-allocations', action='store_true', help='Skip tracemalloc allocation figures')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    parser.add_argument('--compare', type=str, help='JSON results of a previous run to compare against')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.seed, not args.no_allocations)
+
+    report = {
+        'revision': current_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
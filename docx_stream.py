@@ -0,0 +1,135 @@
+"""
+Streaming DOCX reader for the Visual English resource parsers
+
+docx.Document() loads the whole document into an lxml object tree and wraps it in
+python-docx proxies before the first paragraph can be read, which dominates the
+parse time of the large teacher-resource documents and keeps every element in
+memory. The parsers only need the text of each body paragraph, so this module opens
+the docx zip and streams word/document.xml with iterparse instead, clearing each
+paragraph once its text has been read.
+
+Paragraph text follows python-docx's Paragraph.text: the runs that are direct
+children of the paragraph or of a w:hyperlink, with w:tab/w:ptab as a tab, w:br
+(text wrapping) and w:cr as a newline and w:noBreakHyphen as '-'. Only top-level
+body paragraphs are returned, as with Document.paragraphs (table cells are skipped).
+
+Usage:
+    from docx_stream import iter_paragraphs, read_paragraph_texts
+
+    for paragraph in iter_paragraphs('VISUAL 1 - VIDEO FILMS GAMES.docx'):
+        print(paragraph.text, paragraph.links)
+"""
+
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Tuple, Union
+
+DOCUMENT_PART = 'word/document.xml'
+DOCUMENT_RELS_PART = 'word/_rels/document.xml.rels'
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_PARAGRAPH = _W + 'p'
+_RUN = _W + 'r'
+_HYPERLINK = _W + 'hyperlink'
+_TEXT = _W + 't'
+_BREAK = _W + 'br'
+_BREAK_TYPE = _W + 'type'
+_RELATIONSHIP_ID = _R + 'id'
+
+# Text equivalents of the run children python-docx translates (w:t and w:br are
+# handled separately)
+_RUN_CONTENT = {
+    _W + 'tab': '\t',
+    _W + 'ptab': '\t',
+    _W + 'cr': '\n',
+    _W + 'noBreakHyphen': '-',
+}
+
+# Depth of top-level paragraphs: w:document > w:body > w:p
+_BODY_CHILD_DEPTH = 3
+
+
+class DocxParagraph(NamedTuple):
+    """Text of one body paragraph and the targets of the hyperlinks in it."""
+    text: str
+    links: Tuple[str, ...]
+
+
+def read_hyperlink_targets(docx_zip: zipfile.ZipFile) -> Dict[str, str]:
+    """Return {relationship id: target} for the hyperlinks of the main document."""
+    try:
+        rels_xml = docx_zip.read(DOCUMENT_RELS_PART)
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in ET.fromstring(rels_xml).iter(_RELS + 'Relationship'):
+        if rel.get('Type', '').endswith('/hyperlink'):
+            targets[rel.get('Id')] = rel.get('Target', '')
+    return targets
+
+
+def _run_text(run: ET.Element) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == _TEXT:
+            if child.text:
+                parts.append(child.text)
+        elif tag == _BREAK:
+            # Page and column breaks have no text equivalent
+            if child.get(_BREAK_TYPE, 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        else:
+            text = _RUN_CONTENT.get(tag)
+            if text:
+                parts.append(text)
+    return ''.join(parts)
+
+
+def _paragraph(element: ET.Element, hyperlink_targets: Dict[str, str]) -> DocxParagraph:
+    parts = []
+    links = []
+    for child in element:
+        if child.tag == _RUN:
+            parts.append(_run_text(child))
+        elif child.tag == _HYPERLINK:
+            for run in child:
+                if run.tag == _RUN:
+                    parts.append(_run_text(run))
+            target = hyperlink_targets.get(child.get(_RELATIONSHIP_ID))
+            if target:
+                links.append(target)
+    return DocxParagraph(''.join(parts), tuple(links))
+
+
+def iter_paragraphs(docx_file: Union[str, BinaryIO]) -> Iterator[DocxParagraph]:
+    """
+    Yield the top-level body paragraphs of a .docx file (a path or a binary file
+    object) in document order, streaming the document XML.
+    """
+    with zipfile.ZipFile(docx_file) as docx_zip:
+        hyperlink_targets = read_hyperlink_targets(docx_zip)
+        with docx_zip.open(DOCUMENT_PART) as document_xml:
+            depth = 0
+            body = None
+            for event, element in ET.iterparse(document_xml, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == _BODY_CHILD_DEPTH - 1:
+                        body = element
+                    continue
+                if depth == _BODY_CHILD_DEPTH:
+                    if element.tag == _PARAGRAPH:
+                        yield _paragraph(element, hyperlink_targets)
+                    # Drop the finished block (paragraph, table or section
+                    # properties) so memory stays flat
+                    body.clear()
+                depth -= 1
+
+
+def read_paragraph_texts(docx_file: Union[str, BinaryIO]) -> List[str]:
+    """Return the text of every top-level body paragraph of a .docx file."""
+    return [paragraph.text for paragraph in iter_paragraphs(docx_file)]
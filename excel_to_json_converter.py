@@ -4,6 +4,10 @@ import json
 import sys
 import os
 import re
+import time
+import argparse
+
+from stage_metrics import metrics, add_instrumentation_arguments, instrumented
 
 def extract_unit_id(sheet_name):
     """Extract unit ID from sheet name."""
@@ -18,7 +22,8 @@ def process_excel(excel_file, book_id):
     
     try:
         # Load Excel file with more robust error handling for binary files
-        excel = pd.ExcelFile(excel_file, engine='openpyxl')
+        with metrics.stage('load'):
+            excel = pd.ExcelFile(excel_file, engine='openpyxl')
         
         # Dictionary to store all Q&A mappings
         mapping = {}
@@ -44,7 +49,8 @@ def process_excel(excel_file, book_id):
                 
                 # Read the sheet data with more robust error handling
                 try:
-                    df = pd.read_excel(excel, sheet_name=sheet_name, engine='openpyxl')
+                    with metrics.stage('read_sheet'):
+                        df = pd.read_excel(excel, sheet_name=sheet_name, engine='openpyxl')
                 except Exception as e:
                     print(f"Error reading sheet {sheet_name}: {e}")
                     continue
@@ -62,6 +68,7 @@ def process_excel(excel_file, book_id):
                 if len(df.columns) >= 3:
                     # Process each row using direct column indices
                     valid_count = 0
+                    rows_start = time.perf_counter()
                     
                     for _, row in df.iterrows():
                         try:
@@ -112,6 +119,8 @@ def process_excel(excel_file, book_id):
                             print(f"Error processing row in sheet {sheet_name}: {row_error}")
                             continue
                     
+                    metrics.add('rows', time.perf_counter() - rows_start, len(df))
+                    metrics.increment('entries', valid_count)
                     total_entries += valid_count
                     print(f"Processed {valid_count} valid entries from sheet {sheet_name}")
                 else:
@@ -190,24 +199,32 @@ def generate_pattern_variations(pattern):
     return list(variations)
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python excel_to_json_converter.py <excel_file> <book_id> [output_file]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Convert a Visual English questions Excel file to a Q&A JSON mapping.',
+        usage='python excel_to_json_converter.py <excel_file> <book_id> [output_file]'
+    )
+    parser.add_argument('excel_file', help='Excel file with one sheet per unit')
+    parser.add_argument('book_id', help='Book ID, e.g. book1')
+    parser.add_argument('output_file', nargs='?', help='Output JSON file (default: qa-mapping-<book_id>.json)')
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
     
-    excel_file = sys.argv[1]
-    book_id = sys.argv[2]
-    output_file = sys.argv[3] if len(sys.argv) > 3 else f"qa-mapping-{book_id}.json"
+    excel_file = args.excel_file
+    book_id = args.book_id
+    output_file = args.output_file or f"qa-mapping-{book_id}.json"
     
     if not os.path.exists(excel_file):
         print(f"Error: Excel file {excel_file} not found")
         sys.exit(1)
     
     try:
-        mapping = process_excel(excel_file, book_id)
-        
-        # Save to JSON file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(mapping, f, ensure_ascii=False, indent=2)
+        with instrumented(args.timings, args.profile):
+            mapping = process_excel(excel_file, book_id)
+            
+            # Save to JSON file
+            with metrics.stage('write', len(mapping)):
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    json.dump(mapping, f, ensure_ascii=False, indent=2)
         
         print(f"Successfully processed {len(mapping)} Q&A entries")
         print(f"Output saved to {output_file}")
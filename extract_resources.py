@@ -1,20 +1,21 @@
-import docx
 import re
 import json
 import os
 
+from docx_stream import read_paragraph_texts
+
 def extract_iframes(docx_path):
     """Extract all iframes from a DOCX file, organized by unit."""
     try:
-        # Open the document
-        doc = docx.Document(docx_path)
+        # Read the paragraph texts
+        paragraph_texts = read_paragraph_texts(docx_path)
         
         # Extract all paragraphs with iframes
         iframes_by_unit = {}
         current_unit = None
         
-        for para in doc.paragraphs:
-            text = para.text.strip()
+        for idx, paragraph_text in enumerate(paragraph_texts):
+            text = paragraph_text.strip()
             
             # Check if this is a unit header
             unit_match = re.search(r'VISUAL 1 - UNIT (\d+)', text)
@@ -40,9 +41,8 @@ def extract_iframes(docx_path):
                     video_id = video_id_match.group(1) if video_id_match else "unknown"
                     
                     # Look for title in previous paragraph
-                    idx = doc.paragraphs.index(para)
                     if idx > 0:
-                        prev_text = doc.paragraphs[idx-1].text.strip()
+                        prev_text = paragraph_texts[idx-1].strip()
                         # If previous text has VIDEO in it, it's likely the title
                         if re.search(r'VIDEO|SONG|FILM|SKIT', prev_text):
                             title = prev_text
@@ -60,9 +60,8 @@ def extract_iframes(docx_path):
                     game_id = game_id_match.group(1) if game_id_match else "unknown"
                     
                     # Look for title in previous paragraph
-                    idx = doc.paragraphs.index(para)
                     if idx > 0:
-                        prev_text = doc.paragraphs[idx-1].text.strip()
+                        prev_text = paragraph_texts[idx-1].strip()
                         # If previous text has GAME or WORDWALL in it, it's likely the title
                         if re.search(r'GAME|WORDWALL', prev_text):
                             title = prev_text
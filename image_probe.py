@@ -0,0 +1,235 @@
+"""
+Image header probing for the Visual English S3 tools
+
+The question generator only sees object keys, but the frontend (S3Image.tsx) needs
+each image's format and dimensions to lay out pages without reflow. This module reads
+them from the first bytes of the object with ranged GETs instead of downloading the
+whole image:
+
+  PNG, GIF, BMP and WebP   size is in the first 30 bytes
+  JPEG                     segments are followed to the SOF marker, fetching more
+                           bytes only when APP (EXIF/ICC) segments push it further out
+
+Results are cached by ETag, so unchanged objects (and copies of the same image under
+other keys) are never probed twice. The cache can be persisted to a JSON file between
+runs.
+
+Usage:
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 \\
+      --probe-images --probe-cache image-headers.json
+"""
+
+import os
+import json
+import struct
+import logging
+import threading
+from typing import Dict, Optional, Any
+
+from botocore.exceptions import ClientError
+
+from stage_metrics import metrics
+
+logger = logging.getLogger('esl-question-generator')
+
+# Bytes requested by the first ranged GET; enough for every format except JPEGs with
+# large APP segments before the frame header
+HEADER_BYTES = 1024
+
+# Give up on headers that are not found within this many bytes
+MAX_HEADER_BYTES = 256 * 1024
+
+# Version of the persisted cache file format
+CACHE_VERSION = 1
+
+# JPEG start-of-frame markers (SOF0-SOF15 without DHT, JPG and DAC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# JPEG markers without a length field
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+class IncompleteHeader(Exception):
+    """Raised by parse_image_header when the header continues past the bytes given."""
+
+    def __init__(self, needed: int):
+        super().__init__(f"Image header needs at least {needed} bytes")
+        self.needed = needed
+
+
+def _require(data: bytes, length: int) -> None:
+    if len(data) < length:
+        raise IncompleteHeader(length)
+
+
+def _image_info(image_format: str, width: int, height: int) -> Dict[str, Any]:
+    return {'format': image_format, 'width': width, 'height': height}
+
+
+def _parse_jpeg(data: bytes) -> Optional[Dict[str, Any]]:
+    """Follow JPEG segments from SOI to the first start-of-frame marker."""
+    pos = 2
+    while True:
+        _require(data, pos + 2)
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before the marker
+            pos += 1
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if marker == 0xDA or marker == 0xD9:
+            # Start of scan or end of image before any frame header
+            return None
+        _require(data, pos + 4)
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            _require(data, pos + 9)
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return _image_info('jpeg', width, height)
+        pos += 2 + length
+
+
+def _parse_webp(data: bytes) -> Optional[Dict[str, Any]]:
+    """Read the canvas size from the first WebP chunk (VP8, VP8L or VP8X)."""
+    _require(data, 30)
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        if data[23:26] != b'\x9d\x01\x2a':
+            return None
+        width, height = struct.unpack('<HH', data[26:30])
+        return _image_info('webp', width & 0x3FFF, height & 0x3FFF)
+    if chunk == b'VP8L':
+        if data[20] != 0x2F:
+            return None
+        bits = struct.unpack('<I', data[21:25])[0]
+        return _image_info('webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b'VP8X':
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return _image_info('webp', width, height)
+    return None
+
+
+def parse_image_header(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Return {'format', 'width', 'height'} for the image whose first bytes are `data`,
+    or None if the format is not recognised.
+    Raises IncompleteHeader if more bytes are needed to find the dimensions.
+    """
+    _require(data, 12)
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        _require(data, 24)
+        if data[12:16] != b'IHDR':
+            return None
+        width, height = struct.unpack('>II', data[16:24])
+        return _image_info('png', width, height)
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', data[6:10])
+        return _image_info('gif', width, height)
+    if data.startswith(b'\xff\xd8'):
+        return _parse_jpeg(data)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return _parse_webp(data)
+    if data.startswith(b'BM'):
+        _require(data, 26)
+        if struct.unpack('<I', data[14:18])[0] == 12:
+            # OS/2 BITMAPCOREHEADER
+            width, height = struct.unpack('<HH', data[18:22])
+        else:
+            width, height = struct.unpack('<ii', data[18:26])
+        # Negative heights mark top-down bitmaps
+        return _image_info('bmp', width, abs(height))
+    return None
+
+
+class ImageHeaderProber:
+    """
+    Reads image format and dimensions from S3 objects with ranged GETs, caching the
+    results by ETag. Safe to share between threads.
+    """
+
+    def __init__(self, s3_client, cache_path: Optional[str] = None,
+                 header_bytes: int = HEADER_BYTES, max_header_bytes: int = MAX_HEADER_BYTES):
+        self.s3_client = s3_client
+        self.cache_path = cache_path
+        self.header_bytes = header_bytes
+        self.max_header_bytes = max_header_bytes
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = self.load_cache(cache_path) if cache_path else {}
+
+    def load_cache(self, cache_path: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Load a persisted {etag: image_info} cache, or return an empty one."""
+        if not os.path.exists(cache_path):
+            return {}
+        try:
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable image header cache {cache_path}: {str(e)}")
+            return {}
+        if cache.get('version') != CACHE_VERSION:
+            logger.warning(f"Image header cache {cache_path} has an unknown version, ignoring it")
+            return {}
+        return cache.get('images', {})
+
+    def save_cache(self) -> None:
+        """Atomically write the cache to cache_path, if one was given."""
+        if not self.cache_path:
+            return
+        with self._lock:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'images': self._cache}, f)
+            os.replace(tmp_path, self.cache_path)
+
+    def _read_range(self, bucket: str, key: str, start: int, end: int):
+        """Return (bytes, object_size, etag) for an inclusive byte range of an object."""
+        response = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+        data = response['Body'].read()
+        content_range = response.get('ContentRange', '')
+        size = int(content_range.rpartition('/')[2]) if '/' in content_range else start + len(data)
+        return data, size, response.get('ETag')
+
+    def probe(self, bucket: str, key: str, etag: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return {'format', 'width', 'height'} for an S3 object, or None if it is not a
+        recognised image. etag is the ETag from the listing; cached results for it are
+        returned without any request.
+        """
+        if etag is not None:
+            with self._lock:
+                if etag in self._cache:
+                    metrics.increment('probe_cache_hits')
+                    return self._cache[etag]
+
+        data = b''
+        end = self.header_bytes
+        info = None
+        with metrics.stage('probe'):
+            try:
+                while True:
+                    chunk, size, response_etag = self._read_range(bucket, key, len(data), end - 1)
+                    data += chunk
+                    etag = etag or response_etag
+                    metrics.increment('probe_requests')
+                    try:
+                        info = parse_image_header(data)
+                        break
+                    except IncompleteHeader as e:
+                        if len(data) >= size or e.needed > self.max_header_bytes:
+                            break
+                        # Read up to the byte the parser needs, at least another header_bytes
+                        end = max(e.needed, len(data) + self.header_bytes)
+            except ClientError as e:
+                # Empty objects cannot satisfy any range
+                if e.response.get('Error', {}).get('Code') != 'InvalidRange':
+                    raise
+
+        if etag is not None:
+            with self._lock:
+                self._cache[etag] = info
+        return info
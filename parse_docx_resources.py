@@ -17,12 +17,13 @@ import re
 import os
 import json
 import boto3
-import docx
 import argparse
 from typing import Dict, List, Optional, Tuple, Any
 from urllib.parse import urlparse, parse_qs
 from io import BytesIO
 
+from docx_stream import read_paragraph_texts
+
 # Type definitions
 ResourceDict = Dict[str, Any]
 UnitDict = Dict[str, Any]
@@ -105,8 +106,7 @@ def extract_title_from_text(text: str) -> str:
 
 def parse_docx_content(docx_file: BytesIO) -> Dict[str, List[ResourceDict]]:
     """Parse the content of a DOCX file and extract structured data."""
-    doc = docx.Document(docx_file)
-    full_text = "\n".join([para.text for para in doc.paragraphs])
+    full_text = "\n".join(read_paragraph_texts(docx_file))
     
     # Extract unit sections
     units_data = {}
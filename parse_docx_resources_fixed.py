@@ -10,26 +10,52 @@ Usage:
     python parse_docx_resources_fixed.py --access-key YOUR_KEY --secret-key YOUR_SECRET
     
     This will process all DOCX files in the 'teacher resources' folder of the
-    visualenglishmaterial S3 bucket and generate resource files in client/src/data/generated
+    visualenglishmaterial S3 bucket and generate resource files in client/src/data/generated.
+    Documents are downloaded concurrently and parsed as they arrive (--workers, default 8).
+
+    python parse_docx_resources_fixed.py --processes
+
+    Parses each document in a separate worker process (one per core, or --processes N)
+    for full-catalogue rebuilds; output is identical to a threaded run.
+
+    python parse_docx_resources_fixed.py --parse-cache .docx-parse-cache
+
+    Parsed documents are cached by ETag; on later runs an unchanged document costs one
+    HEAD request and is neither downloaded nor parsed again.
+
+    python parse_docx_resources_fixed.py --format bundle
+
+    Writes each book's videos and games to one minified JSON bundle
+    (resource-bundles/bookX.json) with a typed loader, resource-bundle-loader.ts,
+    instead of a .tsx module per unit; the client loads only the book in use.
+    Lesson plans for Books 0A-0C are expanded at runtime from one shared template
+    (lesson-plan-template.ts) and a per-book table of unit titles in both formats.
 """
 
 import re
 import os
 import json
+import hashlib
 import argparse
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Tuple, Any
-from urllib.parse import urlparse, parse_qs
 from io import BytesIO
 
 try:
     import boto3
-    import docx
 except ImportError:
-    print("Installing required packages: boto3, python-docx")
+    print("Installing required packages: boto3")
     import subprocess
-    subprocess.check_call(["pip", "install", "boto3", "python-docx"])
+    subprocess.check_call(["pip", "install", "boto3"])
     import boto3
-    import docx
+
+from docx_stream import read_paragraph_texts
+from resource_providers import PROVIDERS, extract_id, scan_embeds
+from stage_metrics import metrics, add_instrumentation_arguments, instrumented
+from storage_backends import create_s3_client
 
 # Type definitions
 ResourceDict = Dict[str, Any]
@@ -37,15 +63,30 @@ UnitDict = Dict[str, Any]
 BookDict = Dict[str, List[UnitDict]]
 
 # Constants
-YOUTUBE_EMBED_PATTERN = r'src="https?://(?:www\.)?youtube\.com/embed/([^"?&\s]+)'
-WORDWALL_EMBED_PATTERN = r'src="https?://(?:www\.)?wordwall\.net/(?:embed|resource)/([^"?&\s]+)'
-ISL_COLLECTIVE_PATTERN = r'src="https?://(?:www\.)?(?:en\.)?islcollective\.com/\w+/\w+/\w+/([0-9]+)'
 UNIT_HEADER_PATTERN = r'VISUAL\s+(\d+[A-Za-z]*)\s*-\s*UNIT\s+(\d+)\s*-\s*(.+?)(?:\n|$)'
 
-# Additional patterns for direct URLs (not in iframe)
-YOUTUBE_URL_PATTERN = r'(?:youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]{11})'
-WORDWALL_URL_PATTERN = r'wordwall\.net/(?:\w+/)?(?:\w+/)?(?:\w+/)?([0-9]+)'
-ISL_COLLECTIVE_URL_PATTERN = r'islcollective\.com/(?:\w+/)?(?:\w+/)?(?:\w+/)?([0-9]+)'
+# Embedded players and links are recognised by the provider registry in
+# resource_providers.py
+
+# Default number of concurrent downloads and parser threads
+DEFAULT_WORKERS = 8
+
+# Output formats of the generated client data: one .tsx module per unit, or one
+# compact JSON bundle per book plus a typed loader (see generate_resource_bundles)
+OUTPUT_FORMATS = ('modules', 'bundle')
+
+# Books that get generated lesson plans, and the module holding their shared template
+LESSON_PLAN_BOOKS = ('0a', '0b', '0c')
+LESSON_PLAN_TEMPLATE_MODULE = 'lesson-plan-template'
+
+# Version of the resource bundle format, checked by the generated loader
+RESOURCE_BUNDLE_VERSION = 1
+RESOURCE_BUNDLE_DIR = 'resource-bundles'
+RESOURCE_BUNDLE_LOADER = 'resource-bundle-loader.ts'
+
+# Version of the parse cache entries; bump it whenever parse_docx_content changes its
+# output so that stale entries are no longer found
+PARSE_CACHE_VERSION = 1
 
 # S3 paths for all resource documents
 RESOURCE_PATHS = [
@@ -63,159 +104,317 @@ RESOURCE_PATHS = [
 
 def setup_aws_client(aws_access_key: Optional[str] = None, 
                     aws_secret_key: Optional[str] = None, 
-                    region: str = 'eu-north-1') -> boto3.client:
-    """Set up and return an S3 client."""
-    if aws_access_key and aws_secret_key:
-        return boto3.client(
-            's3',
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name=region
-        )
-    else:
-        # Use environment variables or IAM role
-        return boto3.client('s3', region_name=region)
+                    region: str = 'eu-north-1',
+                    storage_backend: str = 's3',
+                    max_concurrency: int = 16) -> boto3.client:
+    """
+    Set up and return an S3 client (or a stand-in, see storage_backends.py).
+    Requests go through an adaptive concurrency limit that backs off on SlowDown.
+    """
+    # Without explicit keys, boto3 uses environment variables or the IAM role
+    return create_s3_client(
+        storage_backend,
+        region=region,
+        aws_access_key=aws_access_key,
+        aws_secret_key=aws_secret_key,
+        max_concurrency=max_concurrency
+    )
 
-def download_docx_from_s3(s3_client: boto3.client, bucket: str, key: str) -> BytesIO:
-    """Download a DOCX file from S3 and return it as a BytesIO object."""
+def download_docx_with_etag(s3_client: boto3.client, bucket: str, key: str) -> Tuple[BytesIO, str]:
+    """Download a DOCX file from S3 and return it as a BytesIO object with its ETag."""
     try:
         response = s3_client.get_object(Bucket=bucket, Key=key)
-        return BytesIO(response['Body'].read())
+        return BytesIO(response['Body'].read()), response.get('ETag', '')
     except Exception as e:
         print(f"Error downloading {key}: {e}")
         raise
 
+def download_docx_from_s3(s3_client: boto3.client, bucket: str, key: str) -> BytesIO:
+    """Download a DOCX file from S3 and return it as a BytesIO object."""
+    return download_docx_with_etag(s3_client, bucket, key)[0]
+
+class ParseCache:
+    """
+    Parsed units_data stored on disk by document content: the S3 ETag for documents in
+    the bucket, the sha256 of the file for local files. Each entry is one compact JSON
+    file named after the hash of its content id, so unchanged documents are never
+    downloaded or parsed again and threads can write entries without locking.
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def etag_id(etag: str) -> str:
+        """Content id of an S3 object."""
+        return 'etag:' + etag.strip('"')
+    
+    @staticmethod
+    def sha256_id(data: bytes) -> str:
+        """Content id of a local file."""
+        return f"sha256:{hashlib.sha256(data).hexdigest()}"
+    
+    def _path(self, content_id: str) -> str:
+        digest = hashlib.sha256(f"{PARSE_CACHE_VERSION}:{content_id}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+    
+    def get(self, content_id: str) -> Optional[Dict[str, UnitDict]]:
+        """Return the cached units_data for a document, or None."""
+        try:
+            with open(self._path(content_id), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable parse cache entry for {content_id}: {e}")
+            return None
+        if entry.get('id') != content_id:
+            return None
+        metrics.increment('parse_cache_hits')
+        return entry['units']
+    
+    def put(self, content_id: str, units_data: Dict[str, UnitDict]) -> None:
+        """Atomically store the units_data of a document."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'id': content_id, 'units': units_data}, f, separators=(',', ':'))
+            os.replace(tmp_path, self._path(content_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
 def extract_youtube_id(text: str) -> Optional[str]:
-    """Extract the YouTube video ID from an embed URL or direct URL."""
-    # Try to match embed pattern first
-    match = re.search(YOUTUBE_EMBED_PATTERN, text)
-    if match:
-        return match.group(1)
-    
-    # Try direct URL pattern
-    match = re.search(YOUTUBE_URL_PATTERN, text)
-    if match:
-        return match.group(1)
-    
-    # Try parse from query string if it's a different format
-    parsed_url = urlparse(text)
-    if 'youtube.com' in parsed_url.netloc:
-        query_params = parse_qs(parsed_url.query)
-        if 'v' in query_params:
-            return query_params['v'][0]
-    
-    return None
+    """Extract the YouTube video ID from an embedded player or direct URL."""
+    return extract_id(text, 'youtube')
 
 def extract_wordwall_id(text: str) -> Optional[str]:
-    """Extract the Wordwall game ID from an embed URL or direct URL."""
-    # Try to match embed pattern first
-    match = re.search(WORDWALL_EMBED_PATTERN, text)
-    if match:
-        return match.group(1)
-    
-    # Try direct URL pattern
-    match = re.search(WORDWALL_URL_PATTERN, text)
-    if match:
-        return match.group(1)
-        
-    return None
+    """Extract the Wordwall game ID from an embedded game or direct URL."""
+    return extract_id(text, 'wordwall')
 
 def extract_isl_collective_id(text: str) -> Optional[str]:
-    """Extract the ISL Collective resource ID from an embed URL or direct URL."""
-    # Try to match embed pattern first
-    match = re.search(ISL_COLLECTIVE_PATTERN, text)
-    if match:
-        return match.group(1)
-    
-    # Try direct URL pattern
-    match = re.search(ISL_COLLECTIVE_URL_PATTERN, text)
-    if match:
-        return match.group(1)
-        
-    return None
+    """Extract the ISL Collective resource ID from an embedded lesson or direct URL."""
+    return extract_id(text, 'islcollective')
+
+TITLE_PREFIX_REGEX = re.compile(r'^\d+[a-zA-Z]?\s+(?:VIDEO|ONLINE GAME|SONG|FILM)\s+')
+TITLE_IFRAME_REGEX = re.compile(r'<iframe[^>]*>.*?</iframe>', re.DOTALL)
+WHITESPACE_REGEX = re.compile(r'\s+')
 
 def extract_title_from_text(text: str) -> str:
     """Extract a descriptive title from the text."""
     # Remove common prefixes like 'VIDEO', 'ONLINE GAME', etc.
-    cleaned_text = re.sub(r'^\d+[a-zA-Z]?\s+(?:VIDEO|ONLINE GAME|SONG|FILM)\s+', '', text)
+    cleaned_text = TITLE_PREFIX_REGEX.sub('', text)
     # Remove any iframe content
-    cleaned_text = re.sub(r'<iframe[^>]*>.*?</iframe>', '', cleaned_text, flags=re.DOTALL)
+    cleaned_text = TITLE_IFRAME_REGEX.sub('', cleaned_text)
     # Clean up excess whitespace
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
+    cleaned_text = WHITESPACE_REGEX.sub(' ', cleaned_text).strip()
     return cleaned_text if cleaned_text else "Unknown resource"
 
-def parse_docx_content(docx_file: BytesIO) -> Dict[str, UnitDict]:
-    """Parse the content of a DOCX file and extract structured data."""
-    doc = docx.Document(docx_file)
-    full_text = "\n".join([para.text for para in doc.paragraphs])
-    
-    # Extract unit sections
-    units_data = {}
-    
-    # Split the document into unit sections
-    unit_sections = re.split(UNIT_HEADER_PATTERN, full_text)
-    
-    i = 1  # Skip the first element which is text before the first unit header
-    while i < len(unit_sections):
-        if i + 2 < len(unit_sections):
-            book_id = unit_sections[i]
-            unit_id = unit_sections[i+1]
-            unit_title = unit_sections[i+2].strip()
-            unit_content = unit_sections[i+3] if i+3 < len(unit_sections) else ""
-            
-            # Process the unit content
-            resources = []
-            
-            # Extract YouTube videos
-            youtube_matches = re.finditer(r'<iframe[^>]*src="https://www.youtube.com/embed/([^"?]+)[^>]*>[^<]*</iframe>', unit_content)
-            for match in youtube_matches:
-                full_iframe = match.group(0)
-                youtube_id = match.group(1)
-                preceding_text = unit_content[:match.start()].split('\n')[-1].strip()
-                title = extract_title_from_text(preceding_text)
-                
-                resources.append({
-                    'type': 'video',
-                    'provider': 'YouTube',
-                    'id': youtube_id,
-                    'title': title,
-                    'embed_code': full_iframe,
-                    'url': f'https://www.youtube.com/watch?v={youtube_id}'
-                })
-            
-            # Extract Wordwall games
-            wordwall_matches = re.finditer(r'<iframe[^>]*src="https://wordwall.net/embed/([^"?\s]+)[^>]*>[^<]*</iframe>', unit_content)
-            for match in wordwall_matches:
-                full_iframe = match.group(0)
-                wordwall_id = match.group(1)
-                preceding_text = unit_content[:match.start()].split('\n')[-1].strip()
-                title = extract_title_from_text(preceding_text)
-                
-                resources.append({
-                    'type': 'game',
-                    'provider': 'Wordwall',
-                    'id': wordwall_id,
-                    'title': title,
-                    'embed_code': full_iframe,
-                    'url': f'https://wordwall.net/resource/{wordwall_id}'
-                })
-            
+# Compiled unit header pattern, plus the start of a header that is cut off at the end of
+# a paragraph (its \s can match the newline between paragraphs)
+UNIT_HEADER_REGEX = re.compile(UNIT_HEADER_PATTERN)
+PARTIAL_UNIT_HEADER_REGEX = re.compile(r'VISUAL(?:\s+\d+[A-Za-z]*(?:\s*-(?:\s*UNIT(?:\s+\d+(?:\s*-)?)?)?)?)?\s*$')
+
+class HeaderSpansParagraphs(Exception):
+    """Raised by scan_unit_sections when a unit header continues into the next paragraph."""
+
+def extract_unit_resources(unit_content: str) -> List[ResourceDict]:
+    """
+    Extract the embedded resources in a unit's content with one scan for all providers.
+    Resources are grouped by provider in registry order (YouTube videos, then Wordwall
+    games); providers without a resource type are skipped.
+    """
+    if '<iframe' not in unit_content:
+        return []
+    
+    resources_by_provider = {provider.name: [] for provider in PROVIDERS if provider.resource_type}
+    for link in scan_embeds(unit_content):
+        if link.provider.name not in resources_by_provider:
+            continue
+        # The title is the text before the iframe on the same line
+        line_start = unit_content.rfind('\n', 0, link.start) + 1
+        title = extract_title_from_text(unit_content[line_start:link.start].strip())
+        
+        resources_by_provider[link.provider.name].append({
+            'type': link.provider.resource_type,
+            'provider': link.provider.display_name,
+            'id': link.id,
+            'title': title,
+            'embed_code': link.text,
+            'url': link.provider.resource_url(link.id)
+        })
+    
+    return [resource for resources in resources_by_provider.values() for resource in resources]
+
+def scan_unit_sections(paragraph_texts):
+    """
+    Yield (book_id, unit_id, unit_title, unit_content) for every unit header, in one pass
+    over the paragraphs. unit_content is exactly the text that follows the header in the
+    newline-joined document, up to the next header.
+    Raises HeaderSpansParagraphs if a header continues into the next paragraph; such
+    documents are split on the joined text instead (see split_unit_sections).
+    """
+    header = None
+    pieces = []
+    for text in paragraph_texts:
+        if 'VISUAL' not in text:
+            if header is not None:
+                pieces.append(text)
+            continue
+        
+        start = 0
+        starts_fresh = False
+        for match in UNIT_HEADER_REGEX.finditer(text):
+            if header is not None:
+                pieces.append(text[start:match.start()])
+                yield (*header, '\n'.join(pieces))
+            if not text[match.start(3):].strip():
+                # An empty title makes the header take its title from the next paragraph
+                raise HeaderSpansParagraphs(text)
+            header = (match.group(1), match.group(2), match.group(3).strip())
+            pieces = []
+            start = match.end()
+            # A header that ends the paragraph also consumes the newline after it
+            starts_fresh = start == len(text) and not match.group(0).endswith('\n')
+        
+        tail = text[start:]
+        if PARTIAL_UNIT_HEADER_REGEX.search(tail):
+            raise HeaderSpansParagraphs(text)
+        if header is not None and not starts_fresh:
+            pieces.append(tail)
+    
+    if header is not None:
+        yield (*header, '\n'.join(pieces))
+
+def split_unit_sections(full_text: str):
+    """Yield the same sections as scan_unit_sections from the newline-joined document text."""
+    matches = list(UNIT_HEADER_REGEX.finditer(full_text))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(full_text)
+        yield match.group(1), match.group(2), match.group(3).strip(), full_text[match.end():end]
+
+def parse_paragraphs(paragraph_texts: List[str]) -> Dict[str, UnitDict]:
+    """Extract the units and their resources from a document's paragraph texts."""
+    def build_units(sections):
+        units_data = {}
+        for book_id, unit_id, unit_title, unit_content in sections:
             # Store the unit data
             unit_key = f"book{book_id}_unit{unit_id}"
             units_data[unit_key] = {
                 'book_id': book_id,
                 'unit_id': unit_id,
                 'title': unit_title,
-                'resources': resources
+                'resources': extract_unit_resources(unit_content)
             }
-            
-            i += 3  # Move to the next unit header
+        return units_data
+    
+    try:
+        return build_units(scan_unit_sections(paragraph_texts))
+    except HeaderSpansParagraphs:
+        return build_units(split_unit_sections("\n".join(paragraph_texts)))
+
+def parse_docx_content(docx_file: BytesIO) -> Dict[str, UnitDict]:
+    """Parse the content of a DOCX file and extract structured data."""
+    return parse_paragraphs(read_paragraph_texts(docx_file))
+
+class GeneratedFiles:
+    """
+    Writes generated files only when their content changes, so an unchanged run does
+    not touch the output directory (and does not trigger a dev-server rebuild), and
+    records which files were added, changed, left unchanged or removed.
+    The files generated into an output directory are listed in its manifest
+    (MANIFEST_NAME); stale files are only removed if an earlier run listed them there,
+    so hand-written files next to the generated ones are never deleted.
+    """
+    
+    MANIFEST_NAME = '.generated-files.json'
+    
+    def __init__(self):
+        self.added: List[str] = []
+        self.changed: List[str] = []
+        self.unchanged: List[str] = []
+        self.removed: List[str] = []
+        self._previous: Dict[str, set] = {}
+    
+    def write(self, file_path: str, content: str) -> None:
+        """Atomically write content to file_path unless the file already has that content."""
+        status = self._replace(file_path, content.encode('utf-8'))
+        if status == 'added':
+            self.added.append(file_path)
+        elif status == 'changed':
+            self.changed.append(file_path)
         else:
-            break
+            self.unchanged.append(file_path)
     
-    return units_data
+    @staticmethod
+    def _replace(file_path: str, data: bytes) -> str:
+        """Write data to file_path unless it is already there; return 'added', 'changed' or 'unchanged'."""
+        try:
+            with open(file_path, 'rb') as f:
+                existing_digest = hashlib.sha256(f.read()).digest()
+        except FileNotFoundError:
+            existing_digest = None
+        
+        if existing_digest == hashlib.sha256(data).digest():
+            return 'unchanged'
+        
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        return 'added' if existing_digest is None else 'changed'
+    
+    def written(self) -> set:
+        """Paths generated by this run, whether or not they had to be written."""
+        return set(self.added) | set(self.changed) | set(self.unchanged)
+    
+    def previous_files(self, output_dir: str) -> set:
+        """Paths that earlier runs generated into output_dir, read from its manifest."""
+        if output_dir not in self._previous:
+            manifest_path = os.path.join(output_dir, self.MANIFEST_NAME)
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    names = json.load(f)['files']
+            except FileNotFoundError:
+                names = []
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+                names = []
+            self._previous[output_dir] = {os.path.join(output_dir, name) for name in names}
+        return self._previous[output_dir]
+    
+    def remove_stale(self, output_dir: str, pattern: str) -> None:
+        """
+        Delete files that an earlier run generated into output_dir, whose name matches the
+        regex pattern and that this run did not generate.
+        """
+        written = self.written()
+        regex = re.compile(pattern)
+        for file_path in sorted(self.previous_files(output_dir)):
+            if (regex.fullmatch(os.path.basename(file_path)) and file_path not in written
+                    and os.path.isfile(file_path)):
+                os.remove(file_path)
+                self.removed.append(file_path)
+    
+    def save_manifest(self, output_dir: str) -> None:
+        """
+        Record the files generated into output_dir: this run's, plus earlier runs' files
+        that are still there (e.g. for books whose document was not parsed this time).
+        """
+        removed = set(self.removed)
+        paths = {path for path in self.previous_files(output_dir) if path not in removed and os.path.isfile(path)}
+        paths |= self.written()
+        names = sorted(os.path.relpath(path, output_dir).replace(os.sep, '/') for path in paths)
+        manifest = json.dumps({'files': names}, indent=2) + '\n'
+        self._replace(os.path.join(output_dir, self.MANIFEST_NAME), manifest.encode('utf-8'))
+    
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.unchanged)} unchanged, {len(self.removed)} removed")
 
-def generate_common_resources_file(book_id: str, file_path: str) -> None:
+def generate_common_resources_file(book_id: str, file_path: str,
+                                   files: Optional[GeneratedFiles] = None) -> None:
     """Generate a common resources file for a book if it doesn't exist."""
     # Create unit titles for the book
     js_content = f'''
@@ -291,157 +490,197 @@ export function createBook{book_id}GameResource(
   }};
 }}
 '''
-    with open(file_path, 'w') as f:
-        f.write(js_content)
-    
-    print(f"Generated common resources file at {file_path}")
+    (files or GeneratedFiles()).write(file_path, js_content)
+
+LESSON_PLAN_TEMPLATE_SOURCE = '''
+import { LessonPlan } from '@/components/LessonPlanTemplate';
 
-def generate_lesson_plan_file(book_id: str, unit_id: str, unit_title: str, output_dir: str) -> None:
-    """Generate a lesson plan implementation file for a unit."""
-    file_path = os.path.join(output_dir, f"book{book_id}-unit{unit_id}-implementation.tsx")
-    
-    js_content = f'''
 /**
- * Implementation file for Book {book_id} Unit {unit_id}: {unit_title}
- *
- * This unit focuses on teaching {unit_title.lower()} vocabulary and expressions
+ * Shared lesson-plan template for the generated Book 0A-0C units, written by
+ * parse_docx_resources_fixed.py. Every unit's lesson plans are this template with the
+ * book, unit and unit title filled in at runtime; the unit titles live in the per-book
+ * tables (bookX-lesson-plan-units.ts).
  */
-
-import {{ LessonPlan, LessonStep }} from '@/components/LessonPlanTemplate';
-import {{ TeacherResource }} from '@/components/TeacherResources';
-import {{ book{book_id}Unit{unit_id}Resources }} from './book{book_id}-unit{unit_id}-resources';
-
-// Export a function to get resources for this unit
-export const getBook{book_id}Unit{unit_id}Resources = (): TeacherResource[] => {{
-  return book{book_id}Unit{unit_id}Resources;
-}};
-
-// Export a function to get lesson plans for this unit
-export const generateUnit{unit_id}LessonPlans = (): LessonPlan[] => {{
+export const buildUnitLessonPlans = (bookId: string, unitId: string, unitTitle: string): LessonPlan[] => {
+  const topic = unitTitle.toLowerCase();
   return [
-    // Lesson Plan 1 - Introduction to {unit_title} (45 minutes)
-    {{
-      id: 'book{book_id}-unit{unit_id}-lesson1',
-      title: 'Introduction to {unit_title} - Lesson 1',
+    // Lesson Plan 1 - Introduction (45 minutes)
+    {
+      id: `book${bookId}-unit${unitId}-lesson1`,
+      title: `Introduction to ${unitTitle} - Lesson 1`,
       duration: '45 minutes',
       level: 'Beginner',
       objectives: [
-        'Learn basic {unit_title.lower()} vocabulary',
-        'Identify different {unit_title.lower()} items',
-        'Use simple sentences with {unit_title.lower()} vocabulary'
+        `Learn basic ${topic} vocabulary`,
+        `Identify different ${topic} items`,
+        `Use simple sentences with ${topic} vocabulary`
       ],
       materials: [
-        'Visual English Book {book_id} - Unit {unit_id} slides',
-        '{unit_title} flashcards',
-        '{unit_title} videos from resources section',
+        `Visual English Book ${bookId} - Unit ${unitId} slides`,
+        `${unitTitle} flashcards`,
+        `${unitTitle} videos from resources section`,
         'Drawing paper and colored pencils'
       ],
       steps: [
-        {{
+        {
           title: 'Warm-up',
           duration: '5 minutes',
-          description: 'Greet students and introduce the topic of {unit_title.lower()}. Show flashcards one by one and ask students to repeat the vocabulary.'
-        }},
-        {{
+          description: `Greet students and introduce the topic of ${topic}. Show flashcards one by one and ask students to repeat the vocabulary.`
+        },
+        {
           title: 'Presentation',
           duration: '10 minutes',
-          description: 'Play the {unit_title} vocabulary video. Pause at different points to reinforce vocabulary. Introduce key expressions related to {unit_title.lower()}.'
-        }},
-        {{
+          description: `Play the ${unitTitle} vocabulary video. Pause at different points to reinforce vocabulary. Introduce key expressions related to ${topic}.`
+        },
+        {
           title: 'Practice',
           duration: '15 minutes',
           description: 'Pair activity: Students practice using the vocabulary in simple conversations. Teacher monitors and provides feedback.'
-        }},
-        {{
+        },
+        {
           title: 'Activity',
           duration: '10 minutes',
-          description: 'Students complete a worksheet or game related to {unit_title.lower()} vocabulary.'
-        }},
-        {{
+          description: `Students complete a worksheet or game related to ${topic} vocabulary.`
+        },
+        {
           title: 'Wrap-up',
           duration: '5 minutes',
           description: 'Review the vocabulary learned today. Play a quick game to reinforce learning. Assign simple homework related to the topic.'
-        }}
+        }
       ],
       assessmentTips: 'Monitor students during pair work for proper use of vocabulary. Check worksheet completion for understanding.',
       homeworkIdeas: [
         'Complete a related worksheet',
-        'Draw and label {unit_title.lower()} items learned in class'
+        `Draw and label ${topic} items learned in class`
       ],
       additionalResources: [
-        {{
-          title: '{unit_title} Resources',
+        {
+          title: `${unitTitle} Resources`,
           url: '#'
-        }}
+        }
       ]
-    }},
-    
-    // Lesson Plan 2 - {unit_title} In Practice (45 minutes)
-    {{
-      id: 'book{book_id}-unit{unit_id}-lesson2',
-      title: '{unit_title} In Practice - Lesson 2',
+    },
+
+    // Lesson Plan 2 - In Practice (45 minutes)
+    {
+      id: `book${bookId}-unit${unitId}-lesson2`,
+      title: `${unitTitle} In Practice - Lesson 2`,
       duration: '45 minutes',
       level: 'Beginner',
       objectives: [
-        'Review and expand {unit_title.lower()} vocabulary',
-        'Practice using {unit_title.lower()} in dialogues',
+        `Review and expand ${topic} vocabulary`,
+        `Practice using ${topic} in dialogues`,
         'Develop communication skills through themed activities'
       ],
       materials: [
-        'Visual English Book {book_id} - Unit {unit_id} slides',
-        'Interactive {unit_title.lower()} games',
+        `Visual English Book ${bookId} - Unit ${unitId} slides`,
+        `Interactive ${topic} games`,
         'Role-play cards',
         'Art supplies for craft activity'
       ],
       steps: [
-        {{
+        {
           title: 'Warm-up',
           duration: '5 minutes',
-          description: 'Review {unit_title.lower()} vocabulary from previous lesson with a quick game.'
-        }},
-        {{
+          description: `Review ${topic} vocabulary from previous lesson with a quick game.`
+        },
+        {
           title: 'Presentation',
           duration: '10 minutes',
-          description: 'Introduce new concepts related to {unit_title.lower()}. Show examples and model language patterns.'
-        }},
-        {{
+          description: `Introduce new concepts related to ${topic}. Show examples and model language patterns.`
+        },
+        {
           title: 'Practice',
           duration: '15 minutes',
-          description: 'Group activity: Students work together on a task related to {unit_title.lower()}. Each group presents their work to the class.'
-        }},
-        {{
+          description: `Group activity: Students work together on a task related to ${topic}. Each group presents their work to the class.`
+        },
+        {
           title: 'Interactive Game',
           duration: '10 minutes',
-          description: 'Use one of the Wordwall {unit_title.lower()} games for interactive practice. Students take turns playing while others help.'
-        }},
-        {{
+          description: `Use one of the Wordwall ${topic} games for interactive practice. Students take turns playing while others help.`
+        },
+        {
           title: 'Wrap-up',
           duration: '5 minutes',
-          description: 'Review all vocabulary and concepts learned. Students share one new thing they learned about {unit_title.lower()} today.'
-        }}
+          description: `Review all vocabulary and concepts learned. Students share one new thing they learned about ${topic} today.`
+        }
       ],
       assessmentTips: 'Check student understanding through game participation. Monitor use of language during the group activity.',
       homeworkIdeas: [
-        'Create a project related to {unit_title.lower()}',
+        `Create a project related to ${topic}`,
         'Practice vocabulary with family members'
       ],
       additionalResources: [
-        {{
-          title: '{unit_title} Activity Ideas',
+        {
+          title: `${unitTitle} Activity Ideas`,
           url: '#'
-        }}
+        }
       ]
-    }}
+    }
   ];
+};
+'''
+
+def generate_lesson_plan_template(output_dir: str, files: Optional[GeneratedFiles] = None) -> None:
+    """Generate the lesson-plan template module shared by all lesson-plan books."""
+    file_path = os.path.join(output_dir, f"{LESSON_PLAN_TEMPLATE_MODULE}.ts")
+    (files or GeneratedFiles()).write(file_path, LESSON_PLAN_TEMPLATE_SOURCE)
+
+def generate_lesson_plan_table(book_id: str, book_units: List[UnitDict], output_dir: str,
+                               files: Optional[GeneratedFiles] = None) -> None:
+    """Generate the table of lesson-plan parameters (unit id -> unit title) for a book."""
+    file_path = os.path.join(output_dir, f"book{book_id}-lesson-plan-units.ts")
+    unit_titles = {unit_data['unit_id']: unit_data['title'] for unit_data in book_units}
+    
+    js_content = f'''
+import {{ LessonPlan }} from '@/components/LessonPlanTemplate';
+import {{ buildUnitLessonPlans }} from './{LESSON_PLAN_TEMPLATE_MODULE}';
+
+/**
+ * Lesson-plan parameters for the units of Book {book_id}: unit id -> unit title
+ */
+export const BOOK{book_id.upper()}_LESSON_PLAN_UNITS: Record<string, string> = {json.dumps(unit_titles, indent=2, ensure_ascii=False)};
+
+// Expand the shared lesson-plan template for a unit of Book {book_id}
+export const getBook{book_id}UnitLessonPlans = (unitId: string | number): LessonPlan[] => {{
+  const unitTitle = BOOK{book_id.upper()}_LESSON_PLAN_UNITS[unitId.toString()];
+  return unitTitle === undefined ? [] : buildUnitLessonPlans('{book_id}', unitId.toString(), unitTitle);
 }};
 '''
     
-    with open(file_path, 'w') as f:
-        f.write(js_content)
+    (files or GeneratedFiles()).write(file_path, js_content)
+
+def generate_lesson_plan_file(book_id: str, unit_id: str, unit_title: str, output_dir: str,
+                              files: Optional[GeneratedFiles] = None) -> None:
+    """
+    Generate the lesson plan implementation module of a unit. It keeps the exports the
+    client imports per unit, and expands the shared template from the book's table.
+    """
+    file_path = os.path.join(output_dir, f"book{book_id}-unit{unit_id}-implementation.tsx")
+    
+    js_content = f'''
+/**
+ * Implementation file for Book {book_id} Unit {unit_id}: {unit_title}
+ */
+
+import {{ LessonPlan }} from '@/components/LessonPlanTemplate';
+import {{ TeacherResource }} from '@/components/TeacherResources';
+import {{ book{book_id}Unit{unit_id}Resources }} from './book{book_id}-unit{unit_id}-resources';
+import {{ getBook{book_id}UnitLessonPlans }} from './book{book_id}-lesson-plan-units';
+
+// Export a function to get resources for this unit
+export const getBook{book_id}Unit{unit_id}Resources = (): TeacherResource[] => {{
+  return book{book_id}Unit{unit_id}Resources;
+}};
+
+// Export a function to get lesson plans for this unit
+export const generateUnit{unit_id}LessonPlans = (): LessonPlan[] => getBook{book_id}UnitLessonPlans('{unit_id}');
+'''
     
-    print(f"Generated lesson plan file at {file_path}")
+    (files or GeneratedFiles()).write(file_path, js_content)
 
-def generate_resource_file(book_id: str, unit_id: str, unit_title: str, videos: List[Dict], games: List[Dict], output_dir: str) -> None:
+def generate_resource_file(book_id: str, unit_id: str, unit_title: str, videos: List[Dict], games: List[Dict], output_dir: str,
+                           files: Optional[GeneratedFiles] = None) -> None:
     """Generate a resource file for a specific unit."""
     file_path = os.path.join(output_dir, f"book{book_id}-unit{unit_id}-resources.tsx")
     
@@ -494,14 +733,138 @@ export const book{book_id}Unit{unit_id}Resources: TeacherResource[] = [
 ];
 '''
     
-    with open(file_path, 'w') as f:
-        f.write(js_content)
-    
-    print(f"Generated resource file at {file_path}")
+    (files or GeneratedFiles()).write(file_path, js_content)
 
-def generate_js_resources(units_data: Dict[str, UnitDict], output_dir: str) -> None:
-    """Generate JavaScript resource files based on the parsed data."""
+RESOURCE_BUNDLE_LOADER_SOURCE = '''
+import { TeacherResource } from '@/components/TeacherResources';
+
+/**
+ * Loader for the per-book resource bundles in ./resource-bundles, generated by
+ * parse_docx_resources_fixed.py --format bundle. Each book is a separate chunk that is
+ * only fetched when one of its units is shown.
+ */
+
+export const RESOURCE_BUNDLE_VERSION = %(version)d;
+
+/** [title, id] of a YouTube video or Wordwall game */
+export type BundledResource = [string, string];
+
+export interface ResourceBundleUnit {
+  title: string;
+  videos: BundledResource[];
+  games: BundledResource[];
+}
+
+export interface ResourceBundle {
+  version: number;
+  bookId: string;
+  units: Record<string, ResourceBundleUnit>;
+}
+
+const bundleModules = import.meta.glob<ResourceBundle>('./%(bundle_dir)s/*.json', { import: 'default' });
+const bundleCache = new Map<string, Promise<ResourceBundle | null>>();
+
+/** Load the bundle of a book, or null if there is none */
+export function loadResourceBundle(bookId: string): Promise<ResourceBundle | null> {
+  let bundle = bundleCache.get(bookId);
+  if (!bundle) {
+    const loadModule = bundleModules[`./%(bundle_dir)s/book${bookId}.json`];
+    bundle = loadModule
+      ? loadModule().then((data) => {
+          if (data.version !== RESOURCE_BUNDLE_VERSION) {
+            console.warn(`Resource bundle for Book ${bookId} has version ${data.version}, expected ${RESOURCE_BUNDLE_VERSION}`);
+            return null;
+          }
+          return data;
+        })
+      : Promise.resolve(null);
+    bundleCache.set(bookId, bundle);
+  }
+  return bundle;
+}
+
+/** Unit ids of a book in document order */
+export async function getBundledUnitIds(bookId: string): Promise<string[]> {
+  const bundle = await loadResourceBundle(bookId);
+  return bundle ? Object.keys(bundle.units) : [];
+}
+
+/** Video and game resources of a unit, as the generated per-unit modules define them */
+export async function getBundledUnitResources(bookId: string, unitId: string | number): Promise<TeacherResource[]> {
+  const bundle = await loadResourceBundle(bookId);
+  const unit = bundle?.units[unitId.toString()];
+  if (!unit) {
+    return [];
+  }
+  const unitNumber = Number(unitId);
+  const topic = unit.title.toLowerCase();
+
+  const videos = unit.videos.map(([title, youtubeId], index): TeacherResource => ({
+    id: `book${bookId}-unit${unitNumber}-video${index + 1}`,
+    bookId,
+    unitId: unitNumber.toString(),
+    title,
+    resourceType: 'video',
+    provider: 'YouTube',
+    sourceUrl: `https://www.youtube.com/embed/${youtubeId}`,
+    embedCode: `<iframe width="560" height="315" src="https://www.youtube.com/embed/${youtubeId}" title="YouTube video player" frameborder="0" allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" referrerpolicy="strict-origin-when-cross-origin" allowfullscreen></iframe>`,
+    description: `Educational video for ${topic}`
+  }));
+
+  const games = unit.games.map(([title, wordwallId], index): TeacherResource => {
+    const wordwallUrl = `https://wordwall.net/embed/${wordwallId}`;
+    return {
+      id: `book${bookId}-unit${unitNumber}-game${index + 1}`,
+      bookId,
+      unitId: unitNumber.toString(),
+      title,
+      resourceType: 'game',
+      provider: 'Wordwall',
+      sourceUrl: wordwallUrl,
+      embedCode: `<iframe style="max-width:100%%" src="${wordwallUrl}" width="500" height="380" frameborder="0" allowfullscreen></iframe>`,
+      description: `Interactive game for practicing ${topic}`
+    };
+  });
+
+  return [...videos, ...games];
+}
+''' % {'version': RESOURCE_BUNDLE_VERSION, 'bundle_dir': RESOURCE_BUNDLE_DIR}
+
+def build_resource_bundle(book_id: str, book_units: List[UnitDict]) -> Dict[str, Any]:
+    """Return the compact bundle of a book: its units in document order, keyed by unit id."""
+    units = {}
+    for unit_data in book_units:
+        resources = unit_data['resources']
+        units[unit_data['unit_id']] = {
+            'title': unit_data['title'],
+            'videos': [[r['title'], r['id']] for r in resources if r['type'] == 'video'],
+            'games': [[r['title'], r['id']] for r in resources if r['type'] == 'game']
+        }
+    return {'version': RESOURCE_BUNDLE_VERSION, 'bookId': book_id, 'units': units}
+
+def generate_resource_bundles(books: Dict[str, List[UnitDict]], output_dir: str, files: GeneratedFiles) -> None:
+    """Write one minified JSON bundle per book and the typed loader that reads them."""
+    bundle_dir = os.path.join(output_dir, RESOURCE_BUNDLE_DIR)
+    os.makedirs(bundle_dir, exist_ok=True)
+    for book_id, book_units in books.items():
+        bundle = build_resource_bundle(book_id, book_units)
+        files.write(os.path.join(bundle_dir, f"book{book_id}.json"),
+                    json.dumps(bundle, separators=(',', ':'), ensure_ascii=False))
+    files.write(os.path.join(output_dir, RESOURCE_BUNDLE_LOADER), RESOURCE_BUNDLE_LOADER_SOURCE)
+
+def generate_js_resources(units_data: Dict[str, UnitDict], output_dir: str,
+                          output_format: str = 'modules') -> GeneratedFiles:
+    """
+    Generate JavaScript resource files based on the parsed data.
+    With output_format 'modules' every unit gets a .tsx resource module; with 'bundle'
+    each book's resources go into one JSON bundle read by resource-bundle-loader.ts
+    instead. Lesson-plan books get the shared template and a table of their units in
+    both formats, plus per-unit implementation modules in the 'modules' format.
+    Files are only rewritten when their content changes; unit files of the parsed books
+    that no longer correspond to a unit are removed. Returns the per-file report.
+    """
     os.makedirs(output_dir, exist_ok=True)
+    files = GeneratedFiles()
     
     # Group units by book
     books = {}
@@ -511,12 +874,24 @@ def generate_js_resources(units_data: Dict[str, UnitDict], output_dir: str) -> N
             books[book_id] = []
         books[book_id].append(unit_data)
     
+    if output_format == 'bundle':
+        generate_resource_bundles(books, output_dir, files)
+    
+    lesson_plan_books = [book_id for book_id in books if book_id.lower() in LESSON_PLAN_BOOKS]
+    if lesson_plan_books:
+        generate_lesson_plan_template(output_dir, files)
+    for book_id in lesson_plan_books:
+        generate_lesson_plan_table(book_id, books[book_id], output_dir, files)
+    
     # Generate resource files for each unit
     for book_id, book_units in books.items():
         # Generate common resources file for each book if it doesn't exist
-        common_file_path = os.path.join(output_dir, f"book{book_id}-resources-common.tsx")
-        if not os.path.exists(common_file_path):
-            generate_common_resources_file(book_id, common_file_path)
+        if output_format == 'modules':
+            common_file_path = os.path.join(output_dir, f"book{book_id}-resources-common.tsx")
+            if not os.path.exists(common_file_path):
+                generate_common_resources_file(book_id, common_file_path, files)
+            else:
+                files.unchanged.append(common_file_path)
         
         for unit_data in book_units:
             unit_id = unit_data['unit_id']
@@ -527,37 +902,143 @@ def generate_js_resources(units_data: Dict[str, UnitDict], output_dir: str) -> N
             videos = [r for r in resources if r['type'] == 'video']
             games = [r for r in resources if r['type'] == 'game']
             
-            # Generate the resource file
-            generate_resource_file(book_id, unit_id, unit_title, videos, games, output_dir)
-            
-            # For books 0a, 0b, 0c, also generate lesson plans
-            if book_id.lower() in ['0a', '0b', '0c']:
-                generate_lesson_plan_file(book_id, unit_id, unit_title, output_dir)
+            # Generate the resource file, and the lesson plan module for lesson-plan books
+            if output_format == 'modules':
+                generate_resource_file(book_id, unit_id, unit_title, videos, games, output_dir, files)
+                if book_id in lesson_plan_books:
+                    generate_lesson_plan_file(book_id, unit_id, unit_title, output_dir, files)
+    
+    # Remove unit files this run would have generated for units no longer in the documents
+    for book_id in books:
+        if output_format == 'modules':
+            files.remove_stale(output_dir, rf"book{re.escape(book_id)}-unit\d+-resources\.tsx")
+            if book_id in lesson_plan_books:
+                files.remove_stale(output_dir, rf"book{re.escape(book_id)}-unit\d+-implementation\.tsx")
     
     # Generate a summary file
     summary_path = os.path.join(output_dir, "resources-summary.json")
-    with open(summary_path, 'w') as f:
-        json.dump(units_data, f, indent=2)
+    files.write(summary_path, json.dumps(units_data, indent=2))
+    files.save_manifest(output_dir)
     
-    print(f"Generated summary file at {summary_path}")
+    metrics.increment('files_written', len(files.added) + len(files.changed))
+    metrics.increment('files_unchanged', len(files.unchanged))
+    print(f"Generated files in {output_dir}: {files.summary()}")
+    return files
 
-def process_specific_paths(s3_client, bucket: str, output_dir: str) -> None:
-    """Process the specific resource paths from S3."""
-    all_units_data = {}
+def parse_docx_compact(docx_bytes: bytes) -> Tuple[str, float]:
+    """
+    Parse a DOCX file in a worker process. Returns its units_data as compact JSON, which
+    is cheaper to send back to the parent than the pickled dicts, and the parse time.
+    """
+    start = time.perf_counter()
+    units_data = parse_docx_content(BytesIO(docx_bytes))
+    return json.dumps(units_data, separators=(',', ':')), time.perf_counter() - start
+
+def fetch_and_parse_documents(s3_client, bucket: str, keys: List[str],
+                              max_workers: int = DEFAULT_WORKERS,
+                              parse_cache: Optional[ParseCache] = None,
+                              processes: int = 0) -> Dict[str, Dict[str, UnitDict]]:
+    """
+    Download and parse several DOCX files as a pipeline: downloads run concurrently and
+    each document is handed to the parser pool as soon as it arrives.
+    With a parse_cache, each document is checked with a HEAD request first and its
+    cached units_data is used without downloading or parsing it when the ETag matches.
+    With processes > 0 documents are parsed by that many worker processes instead of
+    threads, so parsing is not limited to one core.
+    Returns {key: units_data} in the order of `keys`; documents that fail are reported
+    and left out.
+    """
+    def download(key):
+        """Return (docx_data, etag), or (None, units_data) for a cache hit."""
+        if parse_cache is not None:
+            with metrics.stage('head'):
+                etag = s3_client.head_object(Bucket=bucket, Key=key).get('ETag', '')
+            units_data = parse_cache.get(ParseCache.etag_id(etag))
+            if units_data is not None:
+                return None, units_data
+        with metrics.stage('download'):
+            return download_docx_with_etag(s3_client, bucket, key)
     
-    for key in RESOURCE_PATHS:
-        print(f"Processing {key}...")
-        try:
-            docx_data = download_docx_from_s3(s3_client, bucket, key)
+    def parse(docx_data, etag):
+        with metrics.stage('parse'):
             units_data = parse_docx_content(docx_data)
-            all_units_data.update(units_data)
+        if parse_cache is not None and etag:
+            parse_cache.put(ParseCache.etag_id(etag), units_data)
+        return units_data
+    
+    parses = {}
+    etags = {}
+    if processes > 0:
+        # Forking while the download threads hold boto3/urllib3, SSL or logging locks
+        # can deadlock the children, so workers start from a clean forkserver process
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        parse_executor = ProcessPoolExecutor(max_workers=processes,
+                                             mp_context=multiprocessing.get_context(start_method))
+    else:
+        parse_executor = ThreadPoolExecutor(max_workers=max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as download_pool, parse_executor as parse_pool:
+        downloads = {}
+        for key in keys:
+            print(f"Processing {key}...")
+            downloads[download_pool.submit(download, key)] = key
+        
+        for future in as_completed(downloads):
+            key = downloads[future]
+            try:
+                docx_data, etag_or_units = future.result()
+                if docx_data is None:
+                    parses[key] = etag_or_units
+                elif processes > 0:
+                    etags[key] = etag_or_units
+                    parses[key] = parse_pool.submit(parse_docx_compact, docx_data.getvalue())
+                else:
+                    parses[key] = parse_pool.submit(parse, docx_data, etag_or_units)
+            except Exception as e:
+                print(f"Error processing {key}: {e}")
+    
+    # Collect in input order so the result does not depend on download timing
+    documents = {}
+    for key in keys:
+        if key not in parses:
+            continue
+        try:
+            parsed = parses[key]
+            if isinstance(parsed, dict):
+                documents[key] = parsed
+            elif key in etags:
+                # Parsed in a worker process: decode its compact result here
+                units_json, seconds = parsed.result()
+                metrics.add('parse', seconds)
+                documents[key] = units_data = json.loads(units_json)
+                if parse_cache is not None and etags[key]:
+                    parse_cache.put(ParseCache.etag_id(etags[key]), units_data)
+            else:
+                documents[key] = parsed.result()
         except Exception as e:
             print(f"Error processing {key}: {e}")
+    return documents
+
+def process_specific_paths(s3_client, bucket: str, output_dir: str, max_workers: int = DEFAULT_WORKERS,
+                           parse_cache: Optional[ParseCache] = None, output_format: str = 'modules',
+                           processes: int = 0) -> None:
+    """
+    Process the specific resource paths from S3.
+    Documents are downloaded and parsed concurrently (in `processes` worker processes if
+    given), then merged in RESOURCE_PATHS order (a later document wins when two define
+    the same unit, as in a sequential run), so the output does not depend on the mode.
+    """
+    all_units_data = {}
+    
+    for key, units_data in fetch_and_parse_documents(s3_client, bucket, RESOURCE_PATHS, max_workers,
+                                                         parse_cache, processes).items():
+        metrics.increment('units', len(units_data))
+        all_units_data.update(units_data)
     
     # Generate resource files
     if all_units_data:
         print(f"Found data for {len(all_units_data)} units.")
-        generate_js_resources(all_units_data, output_dir)
+        with metrics.stage('codegen', len(all_units_data)):
+            generate_js_resources(all_units_data, output_dir, output_format)
     else:
         print("No data extracted.")
 
@@ -569,27 +1050,59 @@ def main():
     parser.add_argument('--secret-key', help='AWS secret key')
     parser.add_argument('--output-dir', default='./client/src/data/generated', help='Output directory for generated files')
     parser.add_argument('--local-file', help='Process a local DOCX file instead of downloading from S3')
+    parser.add_argument('--storage-backend', default='s3',
+                        help='Storage backend: s3, memory[?options] or local:DIR[?options] (see storage_backends.py)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Concurrent downloads and parser threads (default: {DEFAULT_WORKERS}; 1 runs sequentially)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='modules',
+                        help='modules: one .tsx resource module per unit (default); bundle: one minified '
+                             f'JSON bundle per book in {RESOURCE_BUNDLE_DIR}/ plus {RESOURCE_BUNDLE_LOADER}')
+    parser.add_argument('--parse-cache', metavar='DIR',
+                        help='Cache parsed documents in DIR by ETag (sha256 for --local-file) '
+                             'and skip downloading and parsing unchanged documents')
+    parser.add_argument('--processes', type=int, nargs='?', const=os.cpu_count() or 1, default=0, metavar='N',
+                        help='Parse documents in N worker processes instead of parser threads '
+                             '(default without N: one per core)')
+    add_instrumentation_arguments(parser)
     
     args = parser.parse_args()
     
+    with instrumented(args.timings, args.profile):
+        run(args)
+
+def run(args):
+    """Run the parser for parsed command-line arguments."""
+    parse_cache = ParseCache(args.parse_cache) if args.parse_cache else None
+    
     # Process either local file or S3 files
     if args.local_file:
         # Process a local file
         print(f"Processing local file: {args.local_file}")
-        with open(args.local_file, 'rb') as f:
-            docx_data = BytesIO(f.read())
-        units_data = parse_docx_content(docx_data)
+        with metrics.stage('download'):
+            with open(args.local_file, 'rb') as f:
+                docx_bytes = f.read()
+        content_id = ParseCache.sha256_id(docx_bytes) if parse_cache else None
+        units_data = parse_cache.get(content_id) if parse_cache else None
+        if units_data is None:
+            with metrics.stage('parse'):
+                units_data = parse_docx_content(BytesIO(docx_bytes))
+            if parse_cache:
+                parse_cache.put(content_id, units_data)
+        metrics.increment('units', len(units_data))
         
         # Generate resource files
         if units_data:
             print(f"Found data for {len(units_data)} units.")
-            generate_js_resources(units_data, args.output_dir)
+            with metrics.stage('codegen', len(units_data)):
+                generate_js_resources(units_data, args.output_dir, args.format)
         else:
             print("No data extracted.")
     else:
         # Set up S3 client
-        s3_client = setup_aws_client(args.access_key, args.secret_key)
-        process_specific_paths(s3_client, args.bucket, args.output_dir)
+        s3_client = setup_aws_client(args.access_key, args.secret_key, storage_backend=args.storage_backend,
+                                     max_concurrency=max(16, args.workers))
+        process_specific_paths(s3_client, args.bucket, args.output_dir, max(1, args.workers), parse_cache,
+                               args.format, max(0, args.processes))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+"""
+Question service for the Visual English admin UI
+
+Running s3_question_generator.py once per unit pays for the boto3 import, client
+creation, a full listing and serialization every time. In service mode a single
+long-running process keeps the ESLQuestionGenerator and its S3 client warm and serves
+the questions of a prefix over a local HTTP socket:
+
+  GET /questions?folder=book3/unit2              Questions for a prefix, in the same
+                                                 JSON format as a batch run
+  GET /questions?folder=book3/unit2&refresh=1    Rebuild the response now
+  GET /health                                    Liveness check and cache statistics
+
+Two caches sit in front of S3:
+  - Each prefix's serialized response is reused for cache_ttl seconds, which must be
+    shorter than the lifetime of the presigned URLs inside it.
+  - When a response expires, the prefix is listed again but only new or changed
+    objects (by ETag) are processed; the rest reuse their records from an in-memory
+    manifest. Prefixes that have not been requested for record_ttl seconds are
+    dropped from memory.
+
+Usage:
+  python s3_question_generator.py --bucket visualenglishmaterial --serve 8765
+  curl 'http://127.0.0.1:8765/questions?folder=book3/unit2'
+"""
+
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Optional, Tuple, Any
+
+from botocore.exceptions import ClientError
+
+from stage_metrics import metrics
+
+logger = logging.getLogger('esl-question-generator')
+
+# Seconds a prefix's response is served from memory before the prefix is listed again
+DEFAULT_CACHE_TTL = 60
+
+# Seconds after which the records of a prefix nobody asked for are dropped
+DEFAULT_RECORD_TTL = 3600
+
+
+class _PrefixCache:
+    """Cached response and in-memory manifest for one prefix."""
+
+    __slots__ = ('lock', 'objects', 'body', 'built_at', 'last_used')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.body: Optional[bytes] = None
+        self.built_at = 0.0
+        self.last_used = 0.0
+
+
+class QuestionService:
+    """Builds and caches question responses per prefix with a shared generator."""
+
+    def __init__(self, generator, bucket: str, cache_ttl: float = DEFAULT_CACHE_TTL,
+                 record_ttl: float = DEFAULT_RECORD_TTL):
+        if generator.include_urls and cache_ttl >= generator.URL_EXPIRES_IN:
+            raise ValueError(f"cache_ttl must be shorter than the URL lifetime ({generator.URL_EXPIRES_IN}s)")
+        self.generator = generator
+        self.bucket = bucket
+        self.cache_ttl = cache_ttl
+        self.record_ttl = record_ttl
+        self._prefixes: Dict[str, _PrefixCache] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _prefix_cache(self, folder: str) -> _PrefixCache:
+        now = time.monotonic()
+        with self._lock:
+            # Drop prefixes that have not been requested for a while
+            idle = [name for name, cache in self._prefixes.items() if now - cache.last_used > self.record_ttl]
+            for name in idle:
+                del self._prefixes[name]
+            cache = self._prefixes.get(folder)
+            if cache is None:
+                cache = self._prefixes[folder] = _PrefixCache()
+            cache.last_used = now
+            return cache
+
+    def get_questions(self, folder: str, refresh: bool = False) -> Tuple[bytes, bool]:
+        """
+        Return the serialized questions for a prefix and whether they came from the cache.
+        Concurrent requests for the same prefix wait for a single rebuild.
+        """
+        cache = self._prefix_cache(folder)
+        with cache.lock:
+            if not refresh and cache.body is not None and time.monotonic() - cache.built_at < self.cache_ttl:
+                with self._lock:
+                    self.hits += 1
+                return cache.body, True
+
+            with self._lock:
+                self.misses += 1
+            with metrics.stage('service_build'):
+                results, unprocessed_files = self.generator.collect_s3_bucket(
+                    self.bucket, folder, manifest_objects=cache.objects)
+            cache.body = json.dumps({
+                'questions': results,
+                'total_processed': len(results),
+                'total_unprocessed': len(unprocessed_files),
+                'unprocessed_files': unprocessed_files
+            }).encode('utf-8')
+            cache.built_at = time.monotonic()
+            return cache.body, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache statistics for the health endpoint."""
+        with self._lock:
+            prefixes = len(self._prefixes)
+            records = sum(len(cache.objects) for cache in self._prefixes.values())
+            hits, misses = self.hits, self.misses
+        return {'prefixes': prefixes, 'records': records, 'hits': hits, 'misses': misses}
+
+
+class QuestionRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler for the question service (the service is set on the server)."""
+
+    def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send(status, json.dumps({'error': message}).encode('utf-8'))
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == '/health':
+            self._send(200, json.dumps({'status': 'ok', **service.stats()}).encode('utf-8'))
+            return
+
+        if url.path != '/questions':
+            self._send_error(404, f"Unknown path {url.path}")
+            return
+
+        folder = params.get('folder', [''])[0].strip('/')
+        if folder:
+            folder += '/'
+        refresh = params.get('refresh', ['0'])[0] not in ('0', 'false', '')
+
+        start = time.perf_counter()
+        try:
+            body, cached = service.get_questions(folder, refresh)
+        except ClientError as e:
+            logger.error(f"AWS error for folder {folder}: {str(e)}")
+            self._send_error(502, f"S3 error: {e.response.get('Error', {}).get('Code', 'unknown')}")
+            return
+        except Exception as e:
+            logger.error(f"Error building questions for folder {folder}: {str(e)}")
+            self._send_error(500, str(e))
+            return
+
+        self._send(200, body, {
+            'X-Cache': 'HIT' if cached else 'MISS',
+            'Server-Timing': f"build;dur={(time.perf_counter() - start) * 1000:.1f}"
+        })
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+
+def serve_questions(generator, bucket: str, host: str = '127.0.0.1', port: int = 8765,
+                    cache_ttl: float = DEFAULT_CACHE_TTL, record_ttl: float = DEFAULT_RECORD_TTL) -> None:
+    """Serve questions for `bucket` over HTTP until interrupted."""
+    service = QuestionService(generator, bucket, cache_ttl, record_ttl)
+
+    # Create the client once, before the first request needs it
+    generator._ensure_s3_client()
+
+    server = ThreadingHTTPServer((host, port), QuestionRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    logger.info(f"Serving questions for s3://{bucket} on http://{host}:{server.server_address[1]}/questions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping question service")
+    finally:
+        server.server_close()
+        if generator.image_prober is not None:
+            generator.image_prober.save_cache()
@@ -0,0 +1,199 @@
+"""
+Link provider registry for the Visual English resource parsers
+
+Every site whose players or links appear in the teacher-resource documents is
+described once by a LinkProvider: how its embedded iframe looks, how a bare link to
+it looks and, if the generated TypeScript can show it, which resource type it
+becomes. All registered providers are compiled into a single scanner, so finding
+every provider's iframes and URLs is one pass over the text however many providers
+there are:
+
+  YouTube         iframes become 'video' resources
+  Wordwall        iframes become 'game' resources
+  ISL Collective  recognised, but not turned into resources (codegen has no
+                  template for its video lessons yet)
+
+Bare URLs are recognised for every provider but are not resources on their own;
+scan_embeds() runs the same single pass over the iframes only.
+
+The scanner's embed patterns match only complete iframes, as codegen needs their
+surrounding markup. extract_id() is for a single link pulled out of a document and
+is more forgiving: it accepts any src="..." player URL (http or https, with or
+without www., closing tag or not), then a bare URL, then a URL whose id is in its
+query string (youtube.com/watch?feature=share&v=ID).
+
+Usage:
+    from resource_providers import scan_links, register_provider, LinkProvider
+
+    for link in scan_links(unit_content):
+        print(link.provider.name, link.kind, link.id)
+"""
+
+import re
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Link kinds reported by the scanner
+EMBED = 'embed'
+URL = 'url'
+
+
+class LinkProvider(NamedTuple):
+    """
+    A site whose links are recognised in documents. embed_pattern and url_pattern
+    must each capture the resource id in a group named `id` and have no other
+    capturing groups. Patterns that start with a literal character (as '<iframe' and
+    host names do) let the combined scanner skip quickly to candidate positions.
+    id_pattern is the lenient player URL pattern used by extract_id(); query_host and
+    query_param name the host and query parameter of URLs that carry the id in their
+    query string.
+    """
+    name: str
+    display_name: str
+    resource_type: Optional[str]
+    embed_pattern: str
+    url_pattern: str
+    url_template: str
+    id_pattern: str = ''
+    query_host: str = ''
+    query_param: str = ''
+
+    def resource_url(self, resource_id: str) -> str:
+        return self.url_template.format(id=resource_id)
+
+    def extract_id(self, text: str) -> Optional[str]:
+        """Return the id of the first player URL in text, else of a bare or query-string URL."""
+        for pattern in (self.id_pattern or self.embed_pattern, self.url_pattern):
+            if pattern:
+                match = re.search(pattern, text)
+                if match:
+                    return match.group('id')
+        if self.query_param:
+            parsed_url = urlparse(text)
+            if self.query_host in parsed_url.netloc:
+                values = parse_qs(parsed_url.query).get(self.query_param)
+                if values:
+                    return values[0]
+        return None
+
+
+class LinkMatch(NamedTuple):
+    """One iframe or URL found by the scanner."""
+    provider: LinkProvider
+    kind: str
+    id: str
+    start: int
+    end: int
+    text: str
+
+
+class LinkScanner:
+    """
+    All providers' embed and URL patterns compiled into one alternation. Each
+    pattern's id group is renamed to <provider>_<kind>, so the group that matched
+    tells which provider and kind of link was found.
+    """
+
+    def __init__(self, providers: List[LinkProvider], kinds: Tuple[str, ...] = (EMBED, URL)):
+        self.providers = list(providers)
+        self.kinds = kinds
+        alternatives = []
+        self._groups: Dict[str, Tuple[LinkProvider, str]] = {}
+        # Embeds come first so an iframe is reported whole rather than by the URL in it
+        for kind in kinds:
+            for provider in self.providers:
+                pattern = provider.embed_pattern if kind == EMBED else provider.url_pattern
+                if not pattern:
+                    continue
+                compiled = re.compile(pattern)
+                if compiled.groups != 1 or 'id' not in compiled.groupindex:
+                    raise ValueError(f"{provider.name} {kind} pattern must have exactly one capturing group, named id")
+                group_name = f"{provider.name}_{kind}"
+                alternatives.append(pattern.replace('(?P<id>', f"(?P<{group_name}>"))
+                self._groups[group_name] = (provider, kind)
+        self.regex = re.compile('|'.join(alternatives))
+
+    def scan(self, text: str) -> Iterator[LinkMatch]:
+        """Yield every provider link in text, in order of appearance."""
+        groups = self._groups
+        for match in self.regex.finditer(text):
+            group_name = match.lastgroup
+            provider, kind = groups[group_name]
+            yield LinkMatch(provider, kind, match.group(group_name), match.start(), match.end(), match.group(0))
+
+
+def _src_pattern(host: str, path: str) -> str:
+    """Lenient id pattern for a player URL in a src attribute."""
+    return rf'src="https?://(?:www\.)?{host}/{path}/(?P<id>[^"?&\s]+)'
+
+
+PROVIDERS: List[LinkProvider] = [
+    LinkProvider(
+        name='youtube',
+        display_name='YouTube',
+        resource_type='video',
+        embed_pattern=r'<iframe[^>]*src="https://www.youtube.com/embed/(?P<id>[^"?]+)[^>]*>[^<]*</iframe>',
+        url_pattern=r'youtu(?:be\.com/watch\?v=|\.be/)(?P<id>[a-zA-Z0-9_-]{11})',
+        url_template='https://www.youtube.com/watch?v={id}',
+        id_pattern=_src_pattern(r'youtube\.com', 'embed'),
+        query_host='youtube.com',
+        query_param='v'
+    ),
+    LinkProvider(
+        name='wordwall',
+        display_name='Wordwall',
+        resource_type='game',
+        embed_pattern=r'<iframe[^>]*src="https://wordwall.net/embed/(?P<id>[^"?\s]+)[^>]*>[^<]*</iframe>',
+        url_pattern=r'wordwall\.net/(?:\w+/)?(?:\w+/)?(?:\w+/)?(?P<id>[0-9]+)',
+        url_template='https://wordwall.net/resource/{id}',
+        id_pattern=_src_pattern(r'wordwall\.net', '(?:embed|resource)')
+    ),
+    LinkProvider(
+        name='islcollective',
+        display_name='ISL Collective',
+        resource_type=None,
+        embed_pattern=r'<iframe[^>]*src="https?://(?:www\.)?(?:en\.)?islcollective\.com/[\w-]+/embed/(?P<id>[0-9]+)[^>]*>[^<]*</iframe>',
+        url_pattern=r'islcollective\.com/(?:[\w-]+/)?(?:[\w-]+/)?(?:[\w-]+/)?(?P<id>[0-9]+)',
+        url_template='https://en.islcollective.com/english-esl-video-lessons/{id}',
+        id_pattern=r'src="https?://(?:www\.)?(?:en\.)?islcollective\.com/[\w-]+/[\w-]+/[\w-]+/(?P<id>[0-9]+)'
+    ),
+]
+
+_scanner = LinkScanner(PROVIDERS)
+_embed_scanner = LinkScanner(PROVIDERS, (EMBED,))
+
+
+def register_provider(provider: LinkProvider) -> None:
+    """Add a provider (or replace the one with the same name) and rebuild the scanners."""
+    global _scanner, _embed_scanner
+    PROVIDERS[:] = [existing for existing in PROVIDERS if existing.name != provider.name] + [provider]
+    _scanner = LinkScanner(PROVIDERS)
+    _embed_scanner = LinkScanner(PROVIDERS, (EMBED,))
+
+
+def get_provider(name: str) -> LinkProvider:
+    """Return the registered provider called `name`."""
+    for provider in PROVIDERS:
+        if provider.name == name:
+            return provider
+    raise KeyError(name)
+
+
+def extract_id(text: str, name: str) -> Optional[str]:
+    """Return the id of provider `name`'s link in text (see LinkProvider.extract_id)."""
+    return get_provider(name).extract_id(text)
+
+
+def link_scanner() -> LinkScanner:
+    """Return the scanner for the currently registered providers."""
+    return _scanner
+
+
+def scan_links(text: str) -> Iterator[LinkMatch]:
+    """Yield every registered provider's iframes and URLs in text, in one pass."""
+    return _scanner.scan(text)
+
+
+def scan_embeds(text: str) -> Iterator[LinkMatch]:
+    """Yield every registered provider's iframes in text, in one pass."""
+    return _embed_scanner.scan(text)
@@ -12,12 +12,43 @@ Usage:
   # Process images from S3 with explicit AWS credentials
   python s3_question_generator.py --bucket visualenglishmaterial --folder book3/unit2 --access-key YOUR_KEY --secret-key YOUR_SECRET
   
-  # Process images from local directory
-  python s3_question_generator.py --local-dir ./images
+  # Process images from a local directory tree (recursively, using 4 worker processes)
+  python s3_question_generator.py --local-dir ./images --processes 4
   
   # Output to JSON file with pretty formatting
   python s3_question_generator.py --bucket visualenglishmaterial --folder book3/unit2 --output questions.json --pretty
   
+  # Process a large prefix with 32 concurrent workers
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --workers 32
+  
+  # Generate questions only, without presigned image URLs
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --no-urls
+  
+  # Stream records as NDJSON while the listing is still running
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --format ndjson --output questions.ndjson
+  
+  # Process several prefixes in one run, sharing one S3 client, with one output file per prefix
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book1 --folder book2 --output-dir ./questions
+  python s3_question_generator.py --bucket visualenglishmaterial --job-file nightly-jobs.json --output-dir ./questions
+  
+  # Incremental run: only new or changed objects are processed, the rest come from the manifest
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --manifest book3.manifest.json
+  
+  # Add image format and dimensions (read from the image headers, cached by ETag)
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --probe-images --probe-cache headers.json
+  
+  # Whole-bucket run where the same images are uploaded to several units: process each once
+  python s3_question_generator.py --bucket visualenglishmaterial --dedupe --output questions.json
+  
+  # Serve questions to the admin UI from a warm process (GET /questions?folder=book3/unit2)
+  python s3_question_generator.py --bucket visualenglishmaterial --serve 8765
+  
+  # One file per book/unit folder plus manifest.json, so the client loads only the unit it shows
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --no-urls --shard-dir ./questions
+  
+  # Very large prefix: build questions in batches of listed keys instead of one object at a time
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book3 --bulk --format ndjson
+  
 AWS Authentication:
   This script supports three ways to authenticate with AWS:
   1. Environment variables: AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY
@@ -29,16 +60,30 @@ AWS Authentication:
 
 import os
 import re
+import sys
 import json
+import gc
+import hmac
+import hashlib
 import argparse
 import logging
+import threading
+from datetime import datetime, timezone
+from urllib.parse import quote
 from typing import List, Dict, Optional, Tuple, Any
 import mimetypes
-from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from stage_metrics import metrics, add_instrumentation_arguments, instrumented
+from storage_backends import create_s3_client
+from image_probe import ImageHeaderProber
+from question_service import serve_questions, DEFAULT_CACHE_TTL, DEFAULT_RECORD_TTL
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -47,6 +92,99 @@ logging.basicConfig(
 logger = logging.getLogger("esl-question-generator")
 
 
+class S3UrlSigner:
+    """
+    Bulk SigV4 query-string signer for S3 GET URLs.
+    
+    botocore's generate_presigned_url builds a full request object for every call.
+    This signer derives the signing key once per (date, region, service) and then
+    only has to hash the canonical request for each key, which makes signing
+    thousands of URLs a tight loop. Falls back to the client when no static
+    credentials are available.
+    """
+    
+    ALGORITHM = 'AWS4-HMAC-SHA256'
+    SERVICE = 's3'
+    
+    def __init__(self, s3_client, credentials_provider, region: str):
+        self.s3_client = s3_client
+        self.credentials_provider = credentials_provider
+        self.region = region
+        self._signing_keys: Dict[Tuple[str, str, str, str], bytes] = {}
+        self._lock = threading.Lock()
+    
+    def _signing_key(self, secret_key: str, date_stamp: str) -> bytes:
+        """Return the derived SigV4 signing key, computing it at most once per date."""
+        cache_key = (secret_key, date_stamp, self.region, self.SERVICE)
+        signing_key = self._signing_keys.get(cache_key)
+        if signing_key is None:
+            k_date = hmac.new(('AWS4' + secret_key).encode('utf-8'), date_stamp.encode('utf-8'), hashlib.sha256).digest()
+            k_region = hmac.new(k_date, self.region.encode('utf-8'), hashlib.sha256).digest()
+            k_service = hmac.new(k_region, self.SERVICE.encode('utf-8'), hashlib.sha256).digest()
+            signing_key = hmac.new(k_service, b'aws4_request', hashlib.sha256).digest()
+            with self._lock:
+                self._signing_keys[cache_key] = signing_key
+        return signing_key
+    
+    def _host_and_path(self, bucket: str, key: str) -> Tuple[str, str]:
+        """Return the (host, canonical URI) for an object, preferring virtual-hosted style."""
+        encoded_key = quote(key, safe='/~')
+        if re.match(r'^[a-z0-9][a-z0-9-]{1,61}[a-z0-9]$', bucket):
+            return f"{bucket}.s3.{self.region}.amazonaws.com", f"/{encoded_key}"
+        return f"s3.{self.region}.amazonaws.com", f"/{quote(bucket, safe='')}/{encoded_key}"
+    
+    def sign(self, bucket: str, key: str, expires_in: int = 3600) -> str:
+        """Return a presigned GET URL for a single object."""
+        return self.sign_many(bucket, [key], expires_in)[0]
+    
+    def sign_many(self, bucket: str, keys: List[str], expires_in: int = 3600,
+                  now: Optional[datetime] = None) -> List[str]:
+        """Return presigned GET URLs for many objects, all signed with the same timestamp."""
+        credentials = self.credentials_provider()
+        if credentials is None:
+            return [
+                self.s3_client.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': bucket, 'Key': key},
+                    ExpiresIn=expires_in
+                )
+                for key in keys
+            ]
+        
+        credentials = credentials.get_frozen_credentials()
+        now = now or datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = now.strftime('%Y%m%d')
+        scope = f"{date_stamp}/{self.region}/{self.SERVICE}/aws4_request"
+        signing_key = self._signing_key(credentials.secret_key, date_stamp)
+        
+        # The query string is identical for every key in the batch
+        query_params = {
+            'X-Amz-Algorithm': self.ALGORITHM,
+            'X-Amz-Credential': f"{credentials.access_key}/{scope}",
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires_in),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        if credentials.token:
+            query_params['X-Amz-Security-Token'] = credentials.token
+        canonical_query = '&'.join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, value in sorted(query_params.items())
+        )
+        string_to_sign_prefix = f"{self.ALGORITHM}\n{amz_date}\n{scope}\n"
+        
+        urls = []
+        for key in keys:
+            host, path = self._host_and_path(bucket, key)
+            canonical_request = f"GET\n{path}\n{canonical_query}\nhost:{host}\n\nhost\nUNSIGNED-PAYLOAD"
+            string_to_sign = string_to_sign_prefix + hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+            signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+            urls.append(f"https://{host}{path}?{canonical_query}&X-Amz-Signature={signature}")
+        
+        return urls
+
+
 class ESLQuestionGenerator:
     """Processes image files and generates ESL questions with answer prompts."""
     
@@ -140,11 +278,42 @@ class ESLQuestionGenerator:
         r'^which': 'wh_question'
     }
     
-    def __init__(self, s3_region: str = 'eu-north-1'):
-        """Initialize the ESL Question Generator."""
+    # Default number of concurrent workers for bucket processing
+    DEFAULT_MAX_WORKERS = 16
+    
+    # Number of filenames sent to each process pool task for local directories
+    LOCAL_CHUNK_SIZE = 2000
+    
+    # Lifetime of generated presigned URLs, in seconds
+    URL_EXPIRES_IN = 3600
+    
+    def __init__(self, s3_region: str = 'eu-north-1', max_workers: int = DEFAULT_MAX_WORKERS,
+                 include_urls: bool = True, max_pool_connections: Optional[int] = None,
+                 storage_backend: str = 's3', bulk: bool = False, probe_images: bool = False,
+                 probe_cache_path: Optional[str] = None, dedupe: bool = False):
+        """
+        Initialize the ESL Question Generator.
+        max_pool_connections defaults to max_workers; raise it when several prefixes
+        are processed concurrently on the same generator. storage_backend selects the
+        real S3 client or a stand-in (see storage_backends.py). bulk makes bucket runs
+        build records in batches with build_question_records_bulk. probe_images adds
+        each image's format and dimensions to bucket records (see image_probe.py),
+        cached by ETag in probe_cache_path if given. dedupe processes identical copies of
+        an image only once (see iter_s3_bucket).
+        """
         # Only create the S3 client if we're going to use it
         self.s3_client = None
         self.s3_region = s3_region
+        self.max_workers = max(1, max_workers)
+        self.max_pool_connections = max(self.max_workers, max_pool_connections or 0)
+        self.include_urls = include_urls
+        self.url_signer = None
+        self.storage_backend = storage_backend
+        self.bulk = bulk
+        self.probe_images = probe_images
+        self.probe_cache_path = probe_cache_path
+        self.image_prober = None
+        self.dedupe = dedupe
         
     def _ensure_s3_client(self):
         """Ensure S3 client is initialized when needed"""
@@ -153,17 +322,35 @@ class ESLQuestionGenerator:
             access_key = os.environ.get('AWS_ACCESS_KEY_ID')
             secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
             
-            if access_key and secret_key:
-                logger.info(f"Creating S3 client with credentials from environment variables")
-                self.s3_client = boto3.client(
-                    's3',
-                    region_name=self.s3_region,
-                    aws_access_key_id=access_key,
-                    aws_secret_access_key=secret_key
-                )
+            # Size the connection pool to match the worker pool so threads don't queue on connections
+            client_config = Config(max_pool_connections=self.max_pool_connections)
+            
+            if self.storage_backend != 's3':
+                logger.info(f"Creating S3 client for storage backend {self.storage_backend}")
+                self.s3_client = create_s3_client(self.storage_backend, self.s3_region,
+                                                  max_concurrency=self.max_pool_connections)
             else:
-                logger.info(f"Creating S3 client using default credential provider chain")
-                self.s3_client = boto3.client('s3', region_name=self.s3_region)
+                if access_key and secret_key:
+                    logger.info(f"Creating S3 client with credentials from environment variables")
+                    session = boto3.session.Session(
+                        region_name=self.s3_region,
+                        aws_access_key_id=access_key,
+                        aws_secret_access_key=secret_key
+                    )
+                else:
+                    logger.info(f"Creating S3 client using default credential provider chain")
+                    session = boto3.session.Session(region_name=self.s3_region)
+                
+                self.s3_client = create_s3_client(session=session, config=client_config,
+                                                  max_concurrency=self.max_pool_connections)
+                self.url_signer = S3UrlSigner(self.s3_client, session.get_credentials, self.s3_region)
+        
+        if self.url_signer is None:
+            # Clients supplied from outside have no session; sign through the client itself
+            self.url_signer = S3UrlSigner(self.s3_client, lambda: None, self.s3_region)
+        
+        if self.probe_images and self.image_prober is None:
+            self.image_prober = ImageHeaderProber(self.s3_client, self.probe_cache_path)
     
     def is_image_file(self, filename: str) -> bool:
         """Check if a file is an image based on its extension."""
@@ -218,28 +405,191 @@ class ESLQuestionGenerator:
         
         return text
     
+    # Answer prompts for question types that don't come from QUESTION_PATTERNS
+    WH_QUESTION_PROMPTS = ("[Open response]", "[Provide answer]")
+    UNKNOWN_TYPE_PROMPTS = ("[Unknown question type]", "[Please provide appropriate responses]")
+    
+    # Compiled classifier, built lazily from the pattern tables (see _get_question_classifier)
+    _question_classifier = None
+    
+    @classmethod
+    def _get_question_classifier(cls) -> Tuple[re.Pattern, Dict[str, Tuple[str, Tuple[str, str]]]]:
+        """
+        Compile QUESTION_PATTERNS and SPECIAL_QUESTION_PATTERNS into a single anchored
+        alternation with one named group per pattern, so a question is classified with
+        one regex match instead of one per pattern.
+        
+        Alternatives are tried left to right, which keeps the precedence of the
+        original tables: yes/no patterns first, then the special question patterns.
+        Returns a tuple of (compiled_regex, {group_name: (question_type, answer_prompts)}).
+        """
+        if cls._question_classifier is None:
+            alternatives = []
+            outcomes = {}
+            
+            for index, (pattern, answers) in enumerate(cls.QUESTION_PATTERNS.items()):
+                group = f"yes_no_{index}"
+                alternatives.append(f"(?P<{group}>{pattern.lstrip('^')})")
+                outcomes[group] = ('yes_no', (answers['positive'], answers['negative']))
+            
+            for index, (pattern, q_type) in enumerate(cls.SPECIAL_QUESTION_PATTERNS.items()):
+                group = f"special_{index}"
+                alternatives.append(f"(?P<{group}>{pattern.lstrip('^')})")
+                # For WH-questions, we don't provide specific answer templates
+                if q_type == 'wh_question':
+                    outcomes[group] = ('wh_question', cls.WH_QUESTION_PROMPTS)
+                else:
+                    outcomes[group] = ('unknown_type', cls.UNKNOWN_TYPE_PROMPTS)
+            
+            regex = re.compile('^(?:' + '|'.join(alternatives) + ')')
+            cls._question_classifier = (regex, outcomes)
+        
+        return cls._question_classifier
+    
     def determine_question_type(self, question: str) -> Tuple[Optional[str], List[str]]:
         """
         Determine the question type and return appropriate answer prompts.
         Returns a tuple of (question_type, [positive_answer, negative_answer])
         """
-        question_lower = question.lower().strip()
+        return self.classify_many([question])[0]
+    
+    def classify_many(self, questions: List[str]) -> List[Tuple[Optional[str], List[str]]]:
+        """
+        Classify a batch of questions in one pass with the compiled classifier.
+        Returns a list of (question_type, answer_prompts) tuples in input order.
+        """
+        regex, outcomes = self._get_question_classifier()
+        match = regex.match
+        unknown = ('unknown_type', self.UNKNOWN_TYPE_PROMPTS)
         
-        # Check for yes/no question patterns
-        for pattern, answers in self.QUESTION_PATTERNS.items():
-            if re.match(pattern, question_lower):
-                return ('yes_no', [answers['positive'], answers['negative']])
+        classified = []
+        for question in questions:
+            m = match(question.lower().strip())
+            q_type, prompts = outcomes[m.lastgroup] if m else unknown
+            classified.append((q_type, list(prompts)))
         
-        # Check for special question patterns
-        for pattern, q_type in self.SPECIAL_QUESTION_PATTERNS.items():
-            if re.match(pattern, question_lower):
-                # For WH-questions, we don't provide specific answer templates
-                if q_type == 'wh_question':
-                    # Return a descriptive prompt for the teacher
-                    return ('wh_question', ["[Open response]", "[Provide answer]"])
+        return classified
+    
+    def build_question_record(self, filename: str) -> Dict[str, Any]:
+        """Build the question record (without any location fields) for an image filename."""
+        with metrics.stage('clean'):
+            # Clean the filename for question generation
+            clean_name = self.clean_filename(filename)
+            
+            # Format as a question
+            question = self.format_question(clean_name)
         
-        # Unknown question type
-        return ('unknown_type', ["[Unknown question type]", "[Please provide appropriate responses]"])
+        # Determine question type and answer prompts
+        with metrics.stage('classify'):
+            question_type, answer_prompts = self.determine_question_type(question)
+        
+        return {
+            'filename': filename,
+            'question': question,
+            'question_type': question_type,
+            'answer_prompts': answer_prompts
+        }
+    
+    # Newline-framed versions of the clean_filename steps, used by
+    # build_question_records_bulk on "\n"-joined batches of names. Every pattern starts
+    # with the newline in front of a name, which lets the regex engine skip straight to
+    # the next name. The whitespace classes list every str.isspace() character except
+    # the newline itself.
+    _BULK_SPACE = '[ \\t\\x0b\\x0c\\r\\x1c-\\x1f\\x85\\xa0\\u1680\\u2000-\\u200a\\u2028\\u2029\\u202f\\u205f\\u3000]'
+    _BULK_OTHER_SPACE = '[\\t\\x0b\\x0c\\r\\x1c-\\x1f\\x85\\xa0\\u1680\\u2000-\\u200a\\u2028\\u2029\\u202f\\u205f\\u3000]'
+    _BULK_PREFIX_REGEXES = [
+        re.compile(rf'\n\d{{1,2}}{_BULK_SPACE}+[A-Za-z]+(?:{_BULK_SPACE}+[A-Za-z]+)?{_BULK_SPACE}+'),  # "01 A "
+        re.compile(r'\n\d{1,2}_(?:[A-Z]|[A-Z][A-Z])_'),                                           # "01_AB_"
+    ]
+    _BULK_OTHER_SPACE_REGEX = re.compile(_BULK_OTHER_SPACE)
+    _BULK_SPACE_RUN_REGEX = re.compile(f' {_BULK_SPACE}+|{_BULK_OTHER_SPACE}{_BULK_SPACE}*')
+    
+    # Names per bulk batch in bucket runs
+    BULK_BATCH_SIZE = 10000
+    
+    def build_question_records_bulk(self, keys: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Batch equivalent of build_question_record(os.path.basename(key)) for every image key.
+        
+        The per-name Python work is cut down to one pass over the keys (basename,
+        extension check and stem) and building the records. Prefix stripping and
+        separator/whitespace cleanup run as a few regex and str.replace passes over
+        the newline-joined batch, and question typing is looked up once per distinct
+        question opening instead of matched per question.
+        Returns (key, record) pairs for the image keys, in input order.
+        """
+        image_extensions = tuple(self.IMAGE_EXTENSIONS)
+        image_keys = []
+        filenames = []
+        stems = []
+        for key in keys:
+            filename = key.rpartition('/')[2]
+            if filename[:1] == '.':
+                # Leading dots change what splitext calls the extension; use the scalar checks
+                if self.is_image_file(filename):
+                    image_keys.append(key)
+                    filenames.append(filename)
+                    stems.append(os.path.splitext(filename)[0])
+            elif filename.lower().endswith(image_extensions):
+                image_keys.append(key)
+                filenames.append(filename)
+                stems.append(filename[:filename.rindex('.')])
+        if not image_keys:
+            return []
+        
+        text = '\n' + '\n'.join(stems) + '\n'
+        if text.count('\n') != len(stems) + 1:
+            # Newlines inside names would break the framing; fall back to the scalar path
+            return [(key, self.build_question_record(filename))
+                    for key, filename in zip(image_keys, filenames)]
+        
+        # clean_filename: numeric prefixes, then separators and whitespace runs
+        for prefix_regex in self._BULK_PREFIX_REGEXES:
+            text = prefix_regex.sub('\n', text)
+        text = text.replace('_', ' ').replace('-', ' ')
+        if self._BULK_OTHER_SPACE_REGEX.search(text):
+            text = self._BULK_SPACE_RUN_REGEX.sub(' ', text)
+        else:
+            while '  ' in text:
+                text = text.replace('  ', ' ')
+        # Runs are single spaces now, so stripping a name drops at most one at each end
+        text = text.replace('\n ', '\n').replace(' \n', '\n')
+        
+        # format_question
+        questions = [(name[0].upper() + name[1:] + ('' if name.endswith('?') else '?')) if name else ''
+                     for name in text[1:-1].split('\n')]
+        
+        # determine_question_type: when the pattern tables are plain text, only the first
+        # (longest pattern) characters of a question decide its type
+        regex, outcomes = self._get_question_classifier()
+        alternatives = [pattern.lstrip('^') for pattern in [*self.QUESTION_PATTERNS, *self.SPECIAL_QUESTION_PATTERNS]]
+        opening_length = None
+        if all(re.escape(alternative) == alternative for alternative in alternatives):
+            opening_length = max(map(len, alternatives))
+        unknown = ('unknown_type', self.UNKNOWN_TYPE_PROMPTS)
+        classified = {}
+        
+        # Building this many small objects would otherwise trigger repeated GC passes
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            records = []
+            for key, filename, question in zip(image_keys, filenames, questions):
+                opening = question[:opening_length].lower()
+                outcome = classified.get(opening)
+                if outcome is None:
+                    m = regex.match(opening)
+                    outcome = classified[opening] = outcomes[m.lastgroup] if m else unknown
+                records.append((key, {
+                    'filename': filename,
+                    'question': question,
+                    'question_type': outcome[0],
+                    'answer_prompts': list(outcome[1])
+                }))
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return records
     
     def process_s3_file(self, bucket: str, key: str) -> Optional[Dict[str, Any]]:
         """Process a single file from S3 bucket."""
@@ -252,33 +602,13 @@ class ESLQuestionGenerator:
                 logger.debug(f"Skipping non-image file: {key}")
                 return None
             
-            # Extract filename without path
-            filename = os.path.basename(key)
+            # Extract filename without path and build the question record
+            result = self.build_question_record(os.path.basename(key))
             
-            # Clean the filename for question generation
-            clean_name = self.clean_filename(filename)
-            
-            # Format as a question
-            question = self.format_question(clean_name)
-            
-            # Determine question type and answer prompts
-            question_type, answer_prompts = self.determine_question_type(question)
-            
-            # Generate presigned URL for the image
-            s3_url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': bucket, 'Key': key},
-                ExpiresIn=3600  # URL valid for 1 hour
-            )
-            
-            # Create result object
-            result = {
-                'filename': filename,
-                'question': question,
-                'question_type': question_type,
-                'answer_prompts': answer_prompts,
-                's3_url': s3_url
-            }
+            # Generate presigned URL for the image (valid for URL_EXPIRES_IN seconds)
+            if self.include_urls:
+                with metrics.stage('sign'):
+                    result['s3_url'] = self.url_signer.sign(bucket, key, self.URL_EXPIRES_IN)
             
             return result
         
@@ -286,50 +616,337 @@ class ESLQuestionGenerator:
             logger.error(f"Error processing file {key}: {str(e)}")
             return None
     
-    def process_s3_bucket(self, bucket: str, folder: str) -> tuple[list[dict[str, Any]], list[str]]:
+    def add_image_metadata(self, bucket: str, obj: Dict[str, Any], result: Dict[str, Any]) -> None:
         """
-        Process all image files in the specified S3 bucket folder.
-        Returns a tuple of (processed_results, unprocessed_files)
+        Add the 'image' field ({'format', 'width', 'height'} or None) to a record when
+        image probing is enabled and the record does not have it yet.
         """
-        results = []
-        unprocessed_files = []
-        
+        if self.image_prober is None or 'image' in result:
+            return
         try:
-            # Ensure S3 client is initialized
-            self._ensure_s3_client()
-            
-            # Ensure folder ends with / for proper prefix matching
-            if folder and not folder.endswith('/'):
-                folder = folder + '/'
-            
-            # List objects in the folder
-            response = self.s3_client.list_objects_v2(Bucket=bucket, Prefix=folder)
-            
-            if 'Contents' not in response:
-                logger.warning(f"No files found in s3://{bucket}/{folder}")
-                return [], []
-            
-            logger.info(f"Found {len(response['Contents'])} objects in s3://{bucket}/{folder}")
+            result['image'] = self.image_prober.probe(bucket, obj['Key'], obj.get('ETag'))
+        except Exception as e:
+            # A failed probe leaves the record without metadata rather than dropping it
+            logger.warning(f"Could not read image header of {obj['Key']}: {str(e)}")
+    
+    def iter_s3_objects(self, bucket: str, folder: str):
+        """
+        Yield every object under the given prefix, following list_objects_v2 pagination.
+        """
+        self._ensure_s3_client()
+        
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = iter(paginator.paginate(Bucket=bucket, Prefix=folder))
+        while True:
+            with metrics.stage('list'):
+                page = next(pages, None)
+            if page is None:
+                break
+            contents = page.get('Contents', [])
+            metrics.increment('objects_listed', len(contents))
+            for obj in contents:
+                yield obj
+    
+    def _map_bounded(self, func, items):
+        """
+        Apply func to items on a thread pool, yielding (item, result) pairs in input order.
+        At most a small multiple of max_workers tasks are in flight, so items can be
+        consumed lazily from a generator without buffering the whole listing.
+        """
+        max_in_flight = self.max_workers * 2
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item in items:
+                pending.append((item, executor.submit(func, item)))
+                if len(pending) >= max_in_flight:
+                    done_item, future = pending.popleft()
+                    yield done_item, future.result()
             
-            # Process each image file
-            for obj in response['Contents']:
+            while pending:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+    
+    def _iter_bulk_batches(self, bucket: str, objects, reuse_cached):
+        """
+        Batch counterpart of _map_bounded for bucket runs: yields (obj, (result, reused))
+        in input order, BULK_BATCH_SIZE objects at a time. reuse_cached(obj) returns the
+        manifest record for unchanged objects (or None); the rest are built with
+        build_question_records_bulk and signed together with sign_many. Image headers
+        are probed per batch when image probing is enabled.
+        """
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.BULK_BATCH_SIZE:
+                yield from self._process_bulk_batch(bucket, batch, reuse_cached)
+                batch = []
+        if batch:
+            yield from self._process_bulk_batch(bucket, batch, reuse_cached)
+    
+    def _process_bulk_batch(self, bucket: str, batch: List[Dict[str, Any]], reuse_cached):
+        """Process one batch of listed image objects for _iter_bulk_batches."""
+        outcomes = {}
+        fresh_keys = []
+        for obj in batch:
+            result = reuse_cached(obj)
+            if result is not None:
+                outcomes[obj['Key']] = (result, True)
+            else:
+                fresh_keys.append(obj['Key'])
+        
+        try:
+            with metrics.stage('clean', len(fresh_keys)):
+                records = dict(self.build_question_records_bulk(fresh_keys))
+            if self.include_urls and records:
+                keys = list(records)
+                with metrics.stage('sign', len(keys)):
+                    urls = self.url_signer.sign_many(bucket, keys, self.URL_EXPIRES_IN)
+                for key, url in zip(keys, urls):
+                    records[key]['s3_url'] = url
+            for key in fresh_keys:
+                outcomes[key] = (records.get(key), False)
+        except Exception as e:
+            # Fall back to the per-file path, which logs and skips individual failures
+            logger.warning(f"Bulk processing failed for a batch of {len(fresh_keys)} objects, "
+                           f"processing them one by one: {str(e)}")
+            for key in fresh_keys:
+                outcomes[key] = (self.process_s3_file(bucket, key), False)
+        
+        if self.image_prober is not None:
+            # Probe the batch's headers concurrently, each request on its own worker
+            def probe_object(obj):
+                self.add_image_metadata(bucket, obj, outcomes[obj['Key']][0])
+            probed = [obj for obj in batch if outcomes[obj['Key']][0]]
+            for _ in self._map_bounded(probe_object, probed):
+                pass
+        
+        for obj in batch:
+            yield obj, outcomes[obj['Key']]
+    
+    # Version of the incremental manifest file format
+    MANIFEST_VERSION = 1
+    
+    def load_manifest(self, manifest_path: str, bucket: str, folder: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Load the incremental manifest for a bucket/prefix.
+        Returns {key: {'etag', 'last_modified', 'record'}}, or an empty dict if the manifest
+        is missing, unreadable or was written for a different bucket/prefix.
+        """
+        if not manifest_path or not os.path.exists(manifest_path):
+            return {}
+        
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {manifest_path}: {str(e)}")
+            return {}
+        
+        if (manifest.get('version') != self.MANIFEST_VERSION
+                or manifest.get('bucket') != bucket
+                or manifest.get('prefix') != folder):
+            logger.warning(f"Manifest {manifest_path} does not match s3://{bucket}/{folder}, ignoring it")
+            return {}
+        
+        return manifest.get('objects', {})
+    
+    def save_manifest(self, manifest_path: str, bucket: str, folder: str,
+                      objects: Dict[str, Dict[str, Any]]) -> None:
+        """Atomically write the incremental manifest for a bucket/prefix."""
+        manifest = {
+            'version': self.MANIFEST_VERSION,
+            'bucket': bucket,
+            'prefix': folder,
+            'objects': objects
+        }
+        
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    
+    def iter_s3_bucket(self, bucket: str, folder: str, manifest_path: Optional[str] = None,
+                       manifest_objects: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Process all image files in the specified S3 bucket folder, yielding (key, result)
+        pairs in listing order as soon as each one is ready. result is None for files
+        that could not be processed.
+        
+        If manifest_path is given, objects whose ETag and LastModified match the manifest
+        reuse their stored record instead of being processed again, deleted objects drop
+        out, and the manifest is rewritten once the listing has been fully consumed.
+        manifest_objects does the same with an in-memory manifest: the dict is read as
+        the previous state and updated in place at the end of the listing.
+        
+        With dedupe enabled, only the first object with a given ETag, size and filename
+        is processed; its record gets an 's3_key' field. Every later copy is yielded
+        after the listing as an {'type': 'alias', 's3_key', 'alias_of'} record pointing
+        at that canonical key (or as None if the canonical object failed).
+        """
+        # Ensure S3 client is initialized
+        self._ensure_s3_client()
+        
+        # Ensure folder ends with / for proper prefix matching
+        if folder and not folder.endswith('/'):
+            folder = folder + '/'
+        
+        if manifest_objects is not None:
+            previous_objects = dict(manifest_objects)
+        else:
+            previous_objects = self.load_manifest(manifest_path, bucket, folder) if manifest_path else {}
+        current_objects = {}
+        processed_count = 0
+        reused_count = 0
+        failed_keys = set()
+        
+        # Dedupe state: (etag, size, filename) -> canonical key, canonical key -> copies
+        canonical_keys = {}
+        aliases = {}
+        
+        # Stream image objects from the paginated listing into the worker pool
+        listed_count = 0
+        
+        def image_objects():
+            nonlocal listed_count
+            for obj in self.iter_s3_objects(bucket, folder):
+                listed_count += 1
                 key = obj['Key']
                 
-                # Skip the folder itself
-                if key == folder:
+                # Skip the folder itself and non-image files
+                if key == folder or not self.is_image_file(key):
                     continue
                 
-                # Skip non-image files
-                if not self.is_image_file(key):
-                    continue
+                if self.dedupe and obj.get('ETag'):
+                    identity = (obj['ETag'], obj.get('Size'), os.path.basename(key))
+                    canonical_key = canonical_keys.setdefault(identity, key)
+                    if canonical_key != key:
+                        aliases.setdefault(canonical_key, []).append(key)
+                        continue
                 
-                result = self.process_s3_file(bucket, key)
-                if result:
-                    results.append(result)
+                yield obj
+        
+        def reuse_cached(obj):
+            key = obj['Key']
+            cached = previous_objects.get(key)
+            if (cached and cached.get('record')
+                    and cached.get('etag') == obj.get('ETag')
+                    and cached.get('last_modified') == str(obj.get('LastModified'))):
+                # Unchanged object: reuse the stored record, but sign a fresh URL
+                result = dict(cached['record'])
+                if self.include_urls:
+                    try:
+                        with metrics.stage('sign'):
+                            result['s3_url'] = self.url_signer.sign(bucket, key, self.URL_EXPIRES_IN)
+                    except Exception as e:
+                        # Process the object again, which marks it unprocessed if it fails too
+                        logger.warning(f"Could not sign cached record of {key}, processing it again: {str(e)}")
+                        return None
+                return result
+            return None
+        
+        def process_object(obj):
+            result = reuse_cached(obj)
+            reused = result is not None
+            if not reused:
+                result = self.process_s3_file(bucket, obj['Key'])
+            if result:
+                self.add_image_metadata(bucket, obj, result)
+            return result, reused
+        
+        if self.bulk:
+            processed_objects = self._iter_bulk_batches(bucket, image_objects(), reuse_cached)
+        else:
+            processed_objects = self._map_bounded(process_object, image_objects())
+        
+        for obj, (result, reused) in processed_objects:
+            key = obj['Key']
+            if result:
+                processed_count += 1
+                reused_count += reused
+                metrics.increment('records_reused' if reused else 'records_generated')
+                # Presigned URLs expire, so they are never stored in the manifest
+                current_objects[key] = {
+                    'etag': obj.get('ETag'),
+                    'last_modified': str(obj.get('LastModified')),
+                    'record': {k: v for k, v in result.items() if k != 's3_url'}
+                }
+                if self.dedupe:
+                    result['s3_key'] = key
+            else:
+                failed_keys.add(key)
+                metrics.increment('unprocessed')
+            yield key, result
+        
+        # Copies of a canonical object refer to its record instead of repeating it
+        alias_count = 0
+        for canonical_key, copies in aliases.items():
+            for key in copies:
+                if canonical_key in failed_keys:
+                    failed_keys.add(key)
+                    yield key, None
                 else:
-                    unprocessed_files.append(key)
-            
-            return results, unprocessed_files
+                    alias_count += 1
+                    yield key, {'type': 'alias', 's3_key': key, 'alias_of': canonical_key}
+        metrics.increment('aliases', alias_count)
+        
+        if manifest_objects is not None:
+            manifest_objects.clear()
+            manifest_objects.update(current_objects)
+        
+        # An empty listing still rewrites the manifest below, dropping deleted objects
+        if listed_count == 0:
+            logger.warning(f"No files found in s3://{bucket}/{folder}")
+        else:
+            logger.info(f"Found {listed_count} objects in s3://{bucket}/{folder}")
+        if alias_count:
+            logger.info(f"Dedupe: {alias_count} duplicate objects referenced as aliases")
+        
+        if manifest_path:
+            alias_keys = {key for copies in aliases.values() for key in copies}
+            deleted_count = len(set(previous_objects) - set(current_objects) - failed_keys - alias_keys)
+            logger.info(f"Manifest: {processed_count - reused_count} new or changed, "
+                        f"{reused_count} unchanged, {deleted_count} deleted")
+            self.save_manifest(manifest_path, bucket, folder, current_objects)
+        
+        if self.image_prober is not None:
+            self.image_prober.save_cache()
+    
+    def collect_s3_bucket(self, bucket: str, folder: str, manifest_path: Optional[str] = None,
+                          manifest_objects: Optional[Dict[str, Dict[str, Any]]] = None
+                          ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Collect the results of iter_s3_bucket, letting S3 errors propagate.
+        With dedupe, copies are listed in an 'aliases' field of their canonical record
+        instead of being returned.
+        Returns a tuple of (processed_results, unprocessed_files)
+        """
+        results = []
+        unprocessed_files = []
+        records_by_key = {}
+        
+        for key, result in self.iter_s3_bucket(bucket, folder, manifest_path, manifest_objects):
+            if not result:
+                unprocessed_files.append(key)
+            elif result.get('type') == 'alias':
+                records_by_key[result['alias_of']].setdefault('aliases', []).append(key)
+            else:
+                results.append(result)
+                if self.dedupe:
+                    records_by_key[key] = result
+        
+        return results, unprocessed_files
+    
+    def process_s3_bucket(self, bucket: str, folder: str,
+                          manifest_path: Optional[str] = None) -> tuple[list[dict[str, Any]], list[str]]:
+        """
+        Process all image files in the specified S3 bucket folder.
+        See iter_s3_bucket for the manifest and dedupe behaviour and collect_s3_bucket
+        for how aliases are returned.
+        Returns a tuple of (processed_results, unprocessed_files)
+        """
+        try:
+            return self.collect_s3_bucket(bucket, folder, manifest_path)
         
         except ClientError as e:
             logger.error(f"AWS error: {str(e)}")
@@ -338,53 +955,66 @@ class ESLQuestionGenerator:
             logger.error(f"Unexpected error: {str(e)}")
             return [], []
     
-    def process_local_directory(self, directory: str) -> tuple[list[dict[str, Any]], list[str]]:
+    def iter_local_images(self, directory: str):
+        """
+        Recursively walk a local directory with os.scandir, yielding (relative_dir, path)
+        for every image file. Directory entries carry their file type, so no extra stat
+        call is needed per entry. Entries are visited in sorted order so output is
+        grouped by relative path and stable between runs.
+        """
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            relative_dir = os.path.relpath(current, directory)
+            subdirectories = []
+            
+            with os.scandir(current) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file() and self.is_image_file(entry.name):
+                        yield relative_dir, entry.path
+            
+            # Push in reverse so subdirectories are visited in sorted order
+            stack.extend(reversed(subdirectories))
+    
+    def process_local_directory(self, directory: str,
+                                processes: int = 0) -> tuple[list[dict[str, Any]], list[str]]:
         """
-        Process all image files in the specified local directory.
+        Recursively process all image files in the specified local directory.
+        Results are grouped by their directory relative to the root ('relative_path').
+        If processes > 0, cleaning and classification run on a process pool.
         Returns a tuple of (processed_results, unprocessed_files)
         """
         results = []
         unprocessed_files = []
         
         try:
-            directory_path = Path(directory)
-            if not directory_path.exists() or not directory_path.is_dir():
+            if not os.path.isdir(directory):
                 logger.error(f"Directory {directory} does not exist or is not a directory")
                 return [], []
             
-            # Process each file in the directory
-            for file_path in directory_path.iterdir():
-                if not file_path.is_file():
-                    continue
-                
-                # Skip non-image files
-                if not self.is_image_file(file_path.name):
+            images = list(self.iter_local_images(directory))
+            filenames = [os.path.basename(path) for _, path in images]
+            
+            if processes > 0 and len(filenames) > self.LOCAL_CHUNK_SIZE:
+                chunks = [filenames[i:i + self.LOCAL_CHUNK_SIZE]
+                          for i in range(0, len(filenames), self.LOCAL_CHUNK_SIZE)]
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    records = [record for chunk in executor.map(_build_question_records, chunks)
+                               for record in chunk]
+            else:
+                records = _build_question_records(filenames, self)
+            
+            for (relative_dir, path), record in zip(images, records):
+                if record is None:
+                    unprocessed_files.append(path)
                     continue
                 
-                try:
-                    # Clean the filename for question generation
-                    filename = file_path.name
-                    clean_name = self.clean_filename(filename)
-                    
-                    # Format as a question
-                    question = self.format_question(clean_name)
-                    
-                    # Determine question type and answer prompts
-                    question_type, answer_prompts = self.determine_question_type(question)
-                    
-                    # Create result object (no S3 URL for local files)
-                    result = {
-                        'filename': filename,
-                        'question': question,
-                        'question_type': question_type,
-                        'answer_prompts': answer_prompts,
-                        'local_path': str(file_path)
-                    }
-                    
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Error processing file {file_path}: {str(e)}")
-                    unprocessed_files.append(str(file_path))
+                # No S3 URL for local files
+                record['relative_path'] = relative_dir
+                record['local_path'] = path
+                results.append(record)
             
             return results, unprocessed_files
         
@@ -393,6 +1023,23 @@ class ESLQuestionGenerator:
             return [], []
 
 
+def _build_question_records(filenames: List[str],
+                            generator: Optional[ESLQuestionGenerator] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Build question records for a chunk of filenames, with None for files that failed.
+    Defined at module level so it can be sent to process pool workers.
+    """
+    generator = generator or ESLQuestionGenerator()
+    records = []
+    for filename in filenames:
+        try:
+            records.append(generator.build_question_record(filename))
+        except Exception as e:
+            logger.error(f"Error processing file {filename}: {str(e)}")
+            records.append(None)
+    return records
+
+
 def parse_arguments():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description='ESL Question Generator from image filenames.')
@@ -403,50 +1050,163 @@ def parse_arguments():
     source_group.add_argument('--local-dir', type=str, help='Local directory path')
     
     # S3 specific options
-    parser.add_argument('--folder', type=str, help='S3 folder/prefix to process')
+    parser.add_argument('--folder', type=str, action='append',
+                        help='S3 folder/prefix to process (repeat to process several prefixes in one run)')
+    parser.add_argument('--job-file', type=str,
+                        help='JSON file listing prefixes to process: folder strings or '
+                             '{"folder", "output", "manifest"} objects')
     parser.add_argument('--region', type=str, default='eu-north-1', help='AWS region (default: eu-north-1)')
     parser.add_argument('--access-key', type=str, help='AWS access key ID (optional, can use AWS_ACCESS_KEY_ID env var)')
     parser.add_argument('--secret-key', type=str, help='AWS secret access key (optional, can use AWS_SECRET_ACCESS_KEY env var)')
+    parser.add_argument('--workers', type=int, default=ESLQuestionGenerator.DEFAULT_MAX_WORKERS,
+                        help=f'Number of concurrent S3 workers (default: {ESLQuestionGenerator.DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--storage-backend', type=str, default='s3',
+                        help='Storage backend: s3, memory[?options] or local:DIR[?options] (see storage_backends.py)')
+    parser.add_argument('--concurrent-prefixes', type=int, default=4,
+                        help='Number of prefixes processed at the same time in batch mode (default: 4)')
+    
+    parser.add_argument('--no-urls', action='store_true', help='Skip presigned URL generation (questions only)')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Build questions in batches of listed keys instead of one object at a time '
+                             '(faster on very large prefixes)')
+    parser.add_argument('--probe-images', action='store_true',
+                        help='Add each image\'s format and dimensions, read with small ranged GETs')
+    parser.add_argument('--probe-cache', type=str,
+                        help='JSON file caching probed image headers by ETag between runs')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Process identical copies of an image (same ETag, size and filename) once '
+                             'and list the other locations as aliases of the canonical record')
+    parser.add_argument('--manifest', type=str,
+                        help='Manifest file for incremental runs (only new or changed objects are processed)')
+    
+    # Local directory options
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Worker processes for cleaning and classifying local files (default: 0, in-process)')
+    
+    # Service mode options
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='Run as a long-lived HTTP service answering /questions?folder=... on PORT')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address the service listens on (default: 127.0.0.1)')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_CACHE_TTL,
+                        help=f'Seconds a prefix response is served from memory (default: {DEFAULT_CACHE_TTL})')
+    parser.add_argument('--record-ttl', type=float, default=DEFAULT_RECORD_TTL,
+                        help=f'Seconds before records of an unused prefix are dropped (default: {DEFAULT_RECORD_TTL})')
     
     # Output options
     parser.add_argument('--output', type=str, help='Output JSON file path (default: stdout)')
+    parser.add_argument('--output-dir', type=str,
+                        help='Directory for per-prefix output files in batch mode')
+    parser.add_argument('--shard-dir', type=str,
+                        help='Write one JSON file per book/unit folder under this directory, plus a '
+                             'manifest.json with counts and hashes (unchanged shards are not rewritten)')
     parser.add_argument('--pretty', action='store_true', help='Pretty-print JSON output')
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json',
+                        help='Output format: a single JSON document, or streamed NDJSON records '
+                             'followed by a summary record (default: json)')
     
-    return parser.parse_args()
-
-
-def main():
-    """Main entry point of the script."""
-    args = parse_arguments()
+    # Instrumentation options (--timings, --profile)
+    add_instrumentation_arguments(parser)
     
-    # Set AWS credentials in environment variables if provided via command line
-    if args.access_key:
-        os.environ['AWS_ACCESS_KEY_ID'] = args.access_key
-    if args.secret_key:
-        os.environ['AWS_SECRET_ACCESS_KEY'] = args.secret_key
+    args = parser.parse_args()
     
-    # Initialize the question generator
-    generator = ESLQuestionGenerator(s3_region=args.region)
+    if args.serve is not None and not args.bucket:
+        parser.error('--serve requires --bucket')
     
-    results = []
-    unprocessed_files = []
+    if args.bucket and args.serve is None:
+        args.jobs = load_jobs(args.folder, args.job_file)
+        if args.shard_dir and (args.output or args.output_dir):
+            parser.error('--shard-dir cannot be combined with --output or --output-dir')
+        if len(args.jobs) > 1 and args.manifest:
+            parser.error('--manifest cannot be used with several prefixes; set "manifest" per job in --job-file')
+        if len(args.jobs) > 1 and not args.shard_dir:
+            if args.output:
+                parser.error('--output cannot be used with several prefixes; use --output-dir')
+            if not args.output_dir and not all(job['output'] for job in args.jobs):
+                parser.error('--output-dir is required when processing several prefixes')
     
-    # Process either S3 bucket or local directory
-    if args.bucket:
-        logger.info(f"Processing S3 bucket: {args.bucket}, folder: {args.folder or ''}")
-        results, unprocessed_files = generator.process_s3_bucket(args.bucket, args.folder or '')
-    else:
-        logger.info(f"Processing local directory: {args.local_dir}")
-        results, unprocessed_files = generator.process_local_directory(args.local_dir)
+    return args
+
+
+def load_jobs(folders: Optional[List[str]], job_file: Optional[str]) -> List[Dict[str, Optional[str]]]:
+    """
+    Build the list of prefix jobs from repeated --folder arguments and an optional job file.
+    Each job is a dict with 'folder', 'output' and 'manifest' keys.
+    """
+    jobs = [{'folder': folder, 'output': None, 'manifest': None} for folder in folders or []]
     
-    # Display results
-    logger.info(f"Processed {len(results)} image files successfully")
+    if job_file:
+        with open(job_file, 'r') as f:
+            for entry in json.load(f):
+                if isinstance(entry, str):
+                    entry = {'folder': entry}
+                jobs.append({
+                    'folder': entry.get('folder', ''),
+                    'output': entry.get('output'),
+                    'manifest': entry.get('manifest')
+                })
+    
+    # No folder at all means the whole bucket
+    return jobs or [{'folder': '', 'output': None, 'manifest': None}]
+
+
+def default_output_path(output_dir: str, folder: str, output_format: str) -> str:
+    """Return the per-prefix output path used in batch mode, e.g. book3/unit2 -> book3_unit2.json."""
+    name = folder.strip('/').replace('/', '_') or 'root'
+    return os.path.join(output_dir, f"{name}.{output_format}")
+
+
+def log_unprocessed_files(unprocessed_files: List[str]) -> None:
+    """Log a short summary of the files that could not be processed."""
     if unprocessed_files:
         logger.warning(f"Failed to process {len(unprocessed_files)} files:")
         for file in unprocessed_files[:10]:  # Show first 10 failures
             logger.warning(f"  - {file}")
         if len(unprocessed_files) > 10:
             logger.warning(f"  ... and {len(unprocessed_files) - 10} more")
+
+
+def write_ndjson_output(records, out) -> None:
+    """
+    Stream (key, result) pairs as newline-delimited JSON: one question record per line
+    as soon as it is produced, followed by a trailer record of type 'summary'.
+    Alias records from deduplicated runs are written as they come but counted separately.
+    """
+    processed_count = 0
+    alias_count = 0
+    unprocessed_files = []
+    
+    for key, result in records:
+        if result:
+            with metrics.stage('serialize'):
+                out.write(json.dumps(result))
+                out.write('\n')
+            if result.get('type') == 'alias':
+                alias_count += 1
+            else:
+                processed_count += 1
+        else:
+            unprocessed_files.append(key)
+    
+    logger.info(f"Processed {processed_count} image files successfully")
+    log_unprocessed_files(unprocessed_files)
+    
+    out.write(json.dumps({
+        'type': 'summary',
+        'total_processed': processed_count,
+        'total_aliases': alias_count,
+        'total_unprocessed': len(unprocessed_files),
+        'unprocessed_files': unprocessed_files
+    }))
+    out.write('\n')
+
+
+def write_json_output(results: List[Dict[str, Any]], unprocessed_files: List[str],
+                      output: Optional[str], pretty: bool) -> None:
+    """Write all results as a single JSON document to a file or stdout."""
+    # Display results
+    logger.info(f"Processed {len(results)} image files successfully")
+    log_unprocessed_files(unprocessed_files)
     
     # Prepare output
     output_data = {
@@ -457,17 +1217,281 @@ def main():
     }
     
     # Format JSON output
-    indent = 2 if args.pretty else None
-    json_output = json.dumps(output_data, indent=indent)
+    indent = 2 if pretty else None
+    with metrics.stage('serialize', len(results)):
+        json_output = json.dumps(output_data, indent=indent)
     
     # Write to file or stdout
-    if args.output:
-        with open(args.output, 'w') as f:
+    if output:
+        with open(output, 'w') as f:
             f.write(json_output)
-        logger.info(f"Results written to {args.output}")
+        logger.info(f"Results written to {output}")
     else:
         print(json_output)
 
 
+# Version of the shard manifest file format
+SHARD_MANIFEST_VERSION = 1
+
+# Name of the manifest written next to the shards
+SHARD_MANIFEST_NAME = 'manifest.json'
+
+
+def shard_path(folder: str) -> str:
+    """Return the shard file path (relative to the shard directory) for a key folder."""
+    parts = [part for part in folder.split('/') if part]
+    if not parts:
+        return '_root.json'
+    # Keep every folder name a single, non-special path component
+    parts = [quote(part, safe=' -_.').replace('..', '%2E%2E') if part != '.' else '%2E' for part in parts]
+    return os.path.join(*parts[:-1], parts[-1] + '.json')
+
+
+def load_shard_manifest(shard_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Return the {folder: entry} shards of an existing shard manifest, or an empty dict."""
+    manifest_path = os.path.join(shard_dir, SHARD_MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable shard manifest {manifest_path}: {str(e)}")
+        return {}
+    if manifest.get('version') != SHARD_MANIFEST_VERSION:
+        return {}
+    return manifest.get('shards', {})
+
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    """Write data to path through a temporary file, so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_sharded_output(records, shard_dir: str, pretty: bool, max_workers: int,
+                         previous_shards: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Group (key, result) pairs by the folder of their key and write one JSON document
+    per folder under shard_dir, in parallel. Alias records from deduplicated runs are
+    written as copies of their canonical record (with 's3_key' and 'alias_of'), so
+    every shard is self-contained.
+    
+    Shards whose content hash matches previous_shards are not rewritten.
+    Returns the {folder: {'path', 'count', 'unprocessed', 'sha256', 'bytes'}} entries.
+    """
+    shards = {}
+    records_by_key = {}
+    
+    for key, result in records:
+        folder = key.rpartition('/')[0]
+        folder = folder + '/' if folder else ''
+        shard = shards.setdefault(folder, {'questions': [], 'unprocessed_files': []})
+        if not result:
+            shard['unprocessed_files'].append(key)
+        elif result.get('type') == 'alias':
+            shard['questions'].append({**records_by_key[result['alias_of']], 's3_key': key,
+                                       'alias_of': result['alias_of']})
+        else:
+            shard['questions'].append(result)
+            if 's3_key' in result:
+                records_by_key[key] = result
+    
+    indent = 2 if pretty else None
+    
+    def write_shard(item):
+        folder, shard = item
+        with metrics.stage('serialize', len(shard['questions'])):
+            data = json.dumps({
+                'folder': folder,
+                'questions': shard['questions'],
+                'total_processed': len(shard['questions']),
+                'total_unprocessed': len(shard['unprocessed_files']),
+                'unprocessed_files': shard['unprocessed_files']
+            }, indent=indent).encode('utf-8')
+        entry = {
+            'path': shard_path(folder),
+            'count': len(shard['questions']),
+            'unprocessed': len(shard['unprocessed_files']),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'bytes': len(data)
+        }
+        previous = previous_shards.get(folder)
+        path = os.path.join(shard_dir, entry['path'])
+        if previous and previous.get('sha256') == entry['sha256'] and os.path.exists(path):
+            return entry, False
+        with metrics.stage('write'):
+            write_file_atomic(path, data)
+        return entry, True
+    
+    entries = {}
+    written = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for (folder, _), (entry, changed) in zip(shards.items(), executor.map(write_shard, shards.items())):
+            entries[folder] = entry
+            written += changed
+    
+    metrics.increment('shards_written', written)
+    metrics.increment('shards_unchanged', len(entries) - written)
+    logger.info(f"Shards: {written} written, {len(entries) - written} unchanged in {shard_dir}")
+    return entries
+
+
+def write_shard_manifest(shard_dir: str, previous_shards: Dict[str, Dict[str, Any]],
+                         prefixes: List[str], entries: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Write the shard manifest for a run that rebuilt the given prefixes. Shards of those
+    prefixes that were not produced again are deleted; shards outside them are kept.
+    """
+    def rebuilt(folder):
+        return any(folder.startswith(prefix) for prefix in prefixes)
+    
+    shards = {folder: entry for folder, entry in previous_shards.items() if not rebuilt(folder)}
+    for folder, entry in previous_shards.items():
+        if rebuilt(folder) and folder not in entries:
+            path = os.path.join(shard_dir, entry['path'])
+            if os.path.exists(path):
+                os.remove(path)
+    shards.update(entries)
+    
+    manifest = {
+        'version': SHARD_MANIFEST_VERSION,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'total_processed': sum(entry['count'] for entry in shards.values()),
+        'total_unprocessed': sum(entry['unprocessed'] for entry in shards.values()),
+        'shards': dict(sorted(shards.items()))
+    }
+    write_file_atomic(os.path.join(shard_dir, SHARD_MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+
+
+def run_s3_job(generator: ESLQuestionGenerator, bucket: str, job: Dict[str, Optional[str]], args,
+               previous_shards: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Process one S3 prefix and write its output in the requested format.
+    In sharded mode (--shard-dir) returns the shard manifest entries that were written.
+    """
+    folder = job['folder'] or ''
+    output = job['output']
+    if not output and args.output_dir:
+        output = default_output_path(args.output_dir, folder, args.format)
+    
+    logger.info(f"Processing S3 bucket: {bucket}, folder: {folder}")
+    
+    # Sharded output is grouped by key folder; S3 errors propagate so old shards survive
+    if args.shard_dir:
+        records = generator.iter_s3_bucket(bucket, folder, job['manifest'])
+        return write_sharded_output(records, args.shard_dir, args.pretty, args.workers, previous_shards or {})
+    
+    # NDJSON output is written record by record instead of being collected first
+    if args.format == 'ndjson':
+        records = generator.iter_s3_bucket(bucket, folder, job['manifest'])
+        if output:
+            with open(output, 'w') as f:
+                write_ndjson_output(records, f)
+            logger.info(f"Results written to {output}")
+        else:
+            write_ndjson_output(records, sys.stdout)
+        return
+    
+    results, unprocessed_files = generator.process_s3_bucket(bucket, folder, job['manifest'])
+    write_json_output(results, unprocessed_files, output, args.pretty)
+
+
+def main():
+    """Main entry point of the script."""
+    args = parse_arguments()
+    
+    with instrumented(args.timings, args.profile):
+        run(args)
+
+
+def run(args):
+    """Run the generator for parsed command-line arguments."""
+    # Set AWS credentials in environment variables if provided via command line
+    if args.access_key:
+        os.environ['AWS_ACCESS_KEY_ID'] = args.access_key
+    if args.secret_key:
+        os.environ['AWS_SECRET_ACCESS_KEY'] = args.secret_key
+    
+    if args.local_dir:
+        generator = ESLQuestionGenerator(s3_region=args.region, include_urls=not args.no_urls)
+        logger.info(f"Processing local directory: {args.local_dir}")
+        results, unprocessed_files = generator.process_local_directory(args.local_dir, args.processes)
+        
+        if args.format == 'ndjson':
+            records = [(result['local_path'], result) for result in results]
+            records += [(path, None) for path in unprocessed_files]
+            if args.output:
+                with open(args.output, 'w') as f:
+                    write_ndjson_output(records, f)
+                logger.info(f"Results written to {args.output}")
+            else:
+                write_ndjson_output(records, sys.stdout)
+        else:
+            write_json_output(results, unprocessed_files, args.output, args.pretty)
+        return
+    
+    if args.serve is not None:
+        generator = ESLQuestionGenerator(s3_region=args.region, max_workers=args.workers,
+                                         include_urls=not args.no_urls,
+                                         storage_backend=args.storage_backend, bulk=args.bulk,
+                                         probe_images=args.probe_images, probe_cache_path=args.probe_cache,
+                                         dedupe=args.dedupe)
+        serve_questions(generator, args.bucket, args.host, args.serve, args.cache_ttl, args.record_ttl)
+        return
+    
+    jobs = args.jobs
+    if len(jobs) == 1 and args.manifest:
+        jobs[0]['manifest'] = args.manifest
+    if len(jobs) == 1 and args.output:
+        jobs[0]['output'] = args.output
+    
+    # One generator, client and connection pool shared by every prefix in the run
+    concurrent_prefixes = max(1, min(args.concurrent_prefixes, len(jobs)))
+    generator = ESLQuestionGenerator(s3_region=args.region, max_workers=args.workers,
+                                     include_urls=not args.no_urls,
+                                     max_pool_connections=args.workers * concurrent_prefixes,
+                                     storage_backend=args.storage_backend, bulk=args.bulk,
+                                     probe_images=args.probe_images, probe_cache_path=args.probe_cache,
+                                     dedupe=args.dedupe)
+    
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    previous_shards = {}
+    if args.shard_dir:
+        os.makedirs(args.shard_dir, exist_ok=True)
+        previous_shards = load_shard_manifest(args.shard_dir)
+    
+    if len(jobs) == 1 and not args.shard_dir:
+        run_s3_job(generator, args.bucket, jobs[0], args)
+        return
+    
+    # Create the shared client before the prefix threads start using it
+    generator._ensure_s3_client()
+    shard_entries = {}
+    rebuilt_prefixes = []
+    with ThreadPoolExecutor(max_workers=concurrent_prefixes) as executor:
+        futures = [executor.submit(run_s3_job, generator, args.bucket, job, args, previous_shards) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                entries = future.result()
+            except Exception as e:
+                logger.error(f"Error processing prefix {job['folder']}: {str(e)}")
+                continue
+            if args.shard_dir:
+                folder = (job['folder'] or '').strip('/')
+                rebuilt_prefixes.append(folder + '/' if folder else '')
+                shard_entries.update(entries)
+    
+    if args.shard_dir:
+        write_shard_manifest(args.shard_dir, previous_shards, rebuilt_prefixes, shard_entries)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+Stage timing and profiling for the Visual English command-line tools
+
+Every CLI script (s3_question_generator.py, parse_docx_resources_fixed.py,
+excel_to_json_converter.py, analyze_resources.py) records its work against the shared
+`metrics` object in named stages (for example list, clean, classify, sign and serialize
+for the question generator) plus free-form counters. Collection is off by default so it
+costs nothing on normal runs; it is switched on by the flags added with
+add_instrumentation_arguments():
+
+  --timings        Print a per-stage summary table to stderr when the run finishes
+  --profile PATH   Also run under cProfile, write the pstats dump to PATH and print
+                   the top functions by cumulative time. Threads started during the
+                   run (download, parse and worker pools) get their own profiler,
+                   merged into the dump at the end; --processes workers are not
+                   included
+
+Stage times are summed across threads, so a stage that runs on a worker pool can
+report more seconds than the run's wall-clock time.
+"""
+
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Number of functions shown in the --profile summary
+PROFILE_TOP_FUNCTIONS = 25
+
+
+class _StageTimer:
+    """Context manager that adds its elapsed time to one stage."""
+
+    __slots__ = ('metrics', 'name', 'count', 'start')
+
+    def __init__(self, metrics: 'StageMetrics', name: str, count: int):
+        self.metrics = metrics
+        self.name = name
+        self.count = count
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add(self.name, time.perf_counter() - self.start, self.count)
+        return False
+
+
+class _NullTimer:
+    """Timer used while collection is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageMetrics:
+    """Thread-safe per-stage timers and named counters."""
+
+    def __init__(self):
+        self.enabled = False
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.items: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Clear all recorded stages and counters."""
+        with self._lock:
+            self.seconds.clear()
+            self.calls.clear()
+            self.items.clear()
+            self.counters.clear()
+
+    def stage(self, name: str, count: int = 1):
+        """Return a context manager that times one call of a stage covering `count` items."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name, count)
+
+    def add(self, name: str, seconds: float, count: int = 1) -> None:
+        """Record `seconds` spent in a stage on `count` items."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.items[name] = self.items.get(name, 0) + count
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Increase a named counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary_table(self) -> str:
+        """Return the stages and counters as a printable table."""
+        lines = [
+            f"{'STAGE':<20}{'SECONDS':>12}{'CALLS':>10}{'ITEMS':>12}{'ITEMS/SEC':>14}",
+            "-" * 68
+        ]
+        for name, seconds in self.seconds.items():
+            items = self.items[name]
+            rate = f"{items / seconds:>14,.0f}" if seconds else f"{'-':>14}"
+            lines.append(f"{name:<20}{seconds:>12.3f}{self.calls[name]:>10}{items:>12}{rate}")
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'COUNTER':<20}{'VALUE':>12}")
+            lines.append("-" * 32)
+            for name, value in self.counters.items():
+                lines.append(f"{name:<20}{value:>12}")
+        return "\n".join(lines)
+
+
+# Shared metrics for the current process
+metrics = StageMetrics()
+
+
+class _ThreadProfilers:
+    """
+    Profiles the threads started while profiling is on. cProfile only sees the thread
+    that enables it, so start() is installed with threading.setprofile and enables a
+    profiler of its own on each new thread.
+    """
+
+    def __init__(self):
+        self.profilers = []
+        self._lock = threading.Lock()
+
+    def start(self, frame, event, arg):
+        # Runs on the first profile event of a new thread; the thread's profiler replaces it
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: the main profiler already sees every thread
+            return
+        with self._lock:
+            self.profilers.append(profiler)
+
+
+def add_instrumentation_arguments(parser) -> None:
+    """Add the --timings and --profile options to an argparse parser."""
+    parser.add_argument('--timings', action='store_true',
+                        help='Print a per-stage timing summary to stderr at the end of the run')
+    parser.add_argument('--profile', type=str, metavar='PATH',
+                        help='Run under cProfile (main and worker threads, not worker processes), '
+                             'write the pstats dump to PATH and print a summary')
+
+
+@contextmanager
+def instrumented(timings: bool = False, profile_path: Optional[str] = None):
+    """
+    Enable stage collection (and cProfile when profile_path is set) for the duration
+    of the block, then print the summaries to stderr.
+    """
+    if not timings and not profile_path:
+        yield metrics
+        return
+
+    metrics.enabled = True
+    profiler = cProfile.Profile() if profile_path else None
+    thread_profilers = _ThreadProfilers() if profiler else None
+    wall_start = time.perf_counter()
+    if profiler:
+        threading.setprofile(thread_profilers.start)
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler:
+            profiler.disable()
+            threading.setprofile(None)
+        wall_seconds = time.perf_counter() - wall_start
+        metrics.enabled = False
+
+        print(f"\nStage timings (wall clock {wall_seconds:.3f}s):", file=sys.stderr)
+        print(metrics.summary_table(), file=sys.stderr)
+
+        if profiler:
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            for thread_profiler in thread_profilers.profilers:
+                stats.add(thread_profiler)
+            stats.dump_stats(profile_path)
+            print(f"\nProfile written to {profile_path}; top {PROFILE_TOP_FUNCTIONS} functions "
+                  f"by cumulative time (threads merged):", file=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
@@ -0,0 +1,605 @@
+"""
+Storage backends for the Visual English S3 tools
+
+s3_question_generator.py and parse_docx_resources_fixed.py talk to S3 through a small
+subset of the boto3 client API: list_objects_v2 (and its paginator), get_object
+(including ranged GETs), head_object and generate_presigned_url. This module lets
+either tool swap the real client for an in-process stand-in that implements the same
+subset, so pagination and concurrency paths can be load-tested with millions of keys
+without touching AWS.
+
+Backends are selected with a spec string:
+  s3                          Real boto3 client (default)
+  memory                      Empty in-memory store
+  memory?synthetic=1000000    In-memory store pre-filled with synthetic image keys
+  local:/path/to/mirror       Filesystem store: <mirror>/<bucket>/<key>
+
+Options are appended as a query string and apply to the stand-in backends:
+  latency=0.02       Seconds added to every request
+  jitter=0.01        Extra random latency, up to this many seconds
+  throttle=0.01      Probability that a request fails with SlowDown
+  max_rps=3500       Requests per second above which requests fail with SlowDown
+  page_size=1000     Maximum keys per list_objects_v2 page
+  bucket=NAME        Bucket filled by the synthetic option (default: visualenglishmaterial)
+
+Whatever the backend, bulk requests can be routed through AdaptiveS3Client, which
+limits concurrency with an AIMD controller and retries throttled and transient
+failures (5xx responses, request timeouts, connection errors) with jittered
+exponential backoff, so bulk jobs run as fast as the bucket allows without losing
+files to SlowDown errors.
+
+Usage:
+  python s3_question_generator.py --bucket visualenglishmaterial --folder book1 \\
+      --storage-backend "memory?synthetic=1000000&latency=0.005&max_rps=3500"
+"""
+
+import os
+import io
+import time
+import bisect
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Any
+from urllib.parse import parse_qsl, quote
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+
+# Default bucket used by the synthetic memory backend
+DEFAULT_BUCKET = 'visualenglishmaterial'
+
+
+class FakeStreamingBody(io.BytesIO):
+    """Minimal stand-in for botocore's StreamingBody."""
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        """Yield the body in chunks, like StreamingBody.iter_chunks."""
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class FakeS3Paginator:
+    """Paginator over FakeS3Client.list_objects_v2, following continuation tokens."""
+
+    def __init__(self, client: 'FakeS3Client'):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        params = dict(kwargs)
+        while True:
+            page = self.client.list_objects_v2(**params)
+            yield page
+            if not page.get('IsTruncated'):
+                break
+            params['ContinuationToken'] = page['NextContinuationToken']
+
+
+class FakeS3Client:
+    """
+    In-process stand-in for the subset of the boto3 S3 client used by these tools.
+
+    Objects live either in memory or under root_dir/<bucket>/<key>. Every request can
+    be slowed down with latency/jitter and can fail with a SlowDown ClientError, either
+    at random (throttle_rate) or when the request rate exceeds max_rps.
+
+    Under root_dir, a bucket's directory tree is walked once and its sorted key list is
+    reused until put_object changes the bucket, and listings and HEAD requests take
+    the size from os.stat. ETags are the md5 of the content, as S3's are for simple
+    uploads; each file's is computed on first use and reused while its size and mtime
+    stay the same, so a file is hashed once per client however often it is listed.
+    """
+
+    def __init__(self, root_dir: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 throttle_rate: float = 0.0, max_rps: Optional[float] = None,
+                 page_size: int = 1000, region: str = 'eu-north-1'):
+        self.root_dir = root_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.page_size = page_size
+        self.region = region
+
+        # bucket -> {key: (body, last_modified)}; sorted key lists (of either store) are
+        # rebuilt lazily
+        self._objects: Dict[str, Dict[str, Tuple[bytes, datetime]]] = {}
+        self._sorted_keys: Dict[str, List[str]] = {}
+        # path -> (size, mtime_ns, etag) for files under root_dir
+        self._content_etags: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+        # Token bucket for max_rps throttling
+        self._tokens = max_rps or 0.0
+        self._last_refill = time.monotonic()
+
+        # Request counters, handy for load-test reports
+        self.request_counts: Dict[str, int] = {}
+        self.throttled_count = 0
+
+    def _request(self, operation: str) -> None:
+        """Account for a request, applying latency and throttling."""
+        with self._lock:
+            self.request_counts[operation] = self.request_counts.get(operation, 0) + 1
+            throttled = self.throttle_rate and self._rng.random() < self.throttle_rate
+
+            if self.max_rps:
+                now = time.monotonic()
+                self._tokens = min(self.max_rps, self._tokens + (now - self._last_refill) * self.max_rps)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                else:
+                    throttled = True
+
+            if throttled:
+                self.throttled_count += 1
+
+        delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        if throttled:
+            raise ClientError({
+                'Error': {'Code': 'SlowDown', 'Message': 'Please reduce your request rate.'},
+                'ResponseMetadata': {'HTTPStatusCode': 503}
+            }, operation)
+
+    @staticmethod
+    def _error(code: str, message: str, status: int, operation: str) -> ClientError:
+        return ClientError({
+            'Error': {'Code': code, 'Message': message},
+            'ResponseMetadata': {'HTTPStatusCode': status}
+        }, operation)
+
+    def _bucket_path(self, bucket: str) -> str:
+        return os.path.join(self.root_dir, bucket)
+
+    def _walk_keys(self, bucket: str) -> List[str]:
+        """Return the keys of the files under a bucket directory."""
+        bucket_path = self._bucket_path(bucket)
+        keys = []
+        for dirpath, _, filenames in os.walk(bucket_path):
+            for filename in filenames:
+                keys.append(os.path.relpath(os.path.join(dirpath, filename), bucket_path).replace(os.sep, '/'))
+        return keys
+
+    def _keys(self, bucket: str) -> List[str]:
+        """Return the sorted key list for a bucket."""
+        keys = self._sorted_keys.get(bucket)
+        if keys is None:
+            if self.root_dir:
+                keys = sorted(self._walk_keys(bucket))
+                with self._lock:
+                    self._sorted_keys[bucket] = keys
+            else:
+                with self._lock:
+                    keys = sorted(self._objects.get(bucket, {}))
+                    self._sorted_keys[bucket] = keys
+        return keys
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self._bucket_path(bucket), *key.split('/'))
+
+    def _content_etag(self, path: str, st: os.stat_result, body: Optional[bytes] = None) -> str:
+        """Return the content ETag of a file, hashing it (or body, if already read) only when it changed."""
+        cached = self._content_etags.get(path)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
+        if body is not None:
+            etag = self._etag(body)
+        else:
+            with open(path, 'rb') as f:
+                etag = '"' + hashlib.file_digest(f, 'md5').hexdigest() + '"'
+        self._content_etags[path] = (st.st_size, st.st_mtime_ns, etag)
+        return etag
+
+    def _stat(self, bucket: str, key: str, operation: str) -> Tuple[int, str, datetime]:
+        """Return (size, etag, last_modified) for an object, reading a file only if its ETag is not cached."""
+        if self.root_dir:
+            path = self._path(bucket, key)
+            try:
+                st = os.stat(path)
+                etag = self._content_etag(path, st)
+            except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+                raise self._error('NoSuchKey', 'The specified key does not exist.', 404, operation) from None
+            return st.st_size, etag, datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+
+        body, last_modified = self._load(bucket, key, operation)
+        return len(body), self._etag(body), last_modified
+
+    def _load(self, bucket: str, key: str, operation: str) -> Tuple[bytes, datetime]:
+        """Return (body, last_modified) for an object or raise NoSuchKey."""
+        if self.root_dir:
+            path = self._path(bucket, key)
+            if not os.path.isfile(path):
+                raise self._error('NoSuchKey', 'The specified key does not exist.', 404, operation)
+            with open(path, 'rb') as f:
+                body = f.read()
+            return body, datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+
+        try:
+            return self._objects[bucket][key]
+        except KeyError:
+            raise self._error('NoSuchKey', 'The specified key does not exist.', 404, operation) from None
+
+    def _get(self, bucket: str, key: str, operation: str) -> Tuple[bytes, str, datetime]:
+        """Return (body, etag, last_modified) for an object, with the ETag _stat reports."""
+        if self.root_dir:
+            path = self._path(bucket, key)
+            try:
+                with open(path, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    body = f.read()
+            except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+                raise self._error('NoSuchKey', 'The specified key does not exist.', 404, operation) from None
+            last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+            return body, self._content_etag(path, st, body), last_modified
+
+        body, last_modified = self._load(bucket, key, operation)
+        return body, self._etag(body), last_modified
+
+    @staticmethod
+    def _etag(body: bytes) -> str:
+        return '"' + hashlib.md5(body).hexdigest() + '"'
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes = b'', **kwargs) -> Dict[str, Any]:
+        """Store an object."""
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        if self.root_dir:
+            path = self._path(Bucket, Key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(Body)
+            with self._lock:
+                self._sorted_keys.pop(Bucket, None)
+            return {'ETag': self._content_etag(path, os.stat(path), Body)}
+
+        with self._lock:
+            self._objects.setdefault(Bucket, {})[Key] = (Body, datetime.now(timezone.utc))
+            self._sorted_keys.pop(Bucket, None)
+        return {'ETag': self._etag(Body)}
+
+    def add_synthetic_objects(self, bucket: str, count: int, seed: int = 0) -> None:
+        """Fill a bucket with `count` small synthetic image objects spread over book/unit prefixes."""
+        rng = random.Random(seed)
+        subjects = ['is_it_a_cat', 'do_you_like_apples', 'what_is_this', 'can_you_swim',
+                    'where_is_the_school', 'are_they_happy', 'how_old_are_you']
+        extensions = ['.png', '.jpg', '.gif', '.webp']
+        now = datetime.now(timezone.utc)
+        objects = self._objects.setdefault(bucket, {})
+        for index in range(count):
+            key = (f"book{index % 7 + 1}/unit{index // 7 % 18 + 1}/"
+                   f"{index % 100:02d}_{chr(65 + index % 8)}_{rng.choice(subjects)}_{index}"
+                   f"{rng.choice(extensions)}")
+            objects[key] = (b'', now)
+        self._sorted_keys.pop(bucket, None)
+
+    def get_paginator(self, operation_name: str) -> FakeS3Paginator:
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(f"FakeS3Client has no paginator for {operation_name}")
+        return FakeS3Paginator(self)
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', ContinuationToken: Optional[str] = None,
+                        StartAfter: Optional[str] = None, MaxKeys: Optional[int] = None,
+                        **kwargs) -> Dict[str, Any]:
+        """List one page of objects, using the last returned key as the continuation token."""
+        self._request('ListObjectsV2')
+
+        keys = self._keys(Bucket)
+        start_after = ContinuationToken or StartAfter
+        if start_after is not None and start_after >= Prefix:
+            start = bisect.bisect_right(keys, start_after)
+        else:
+            start = bisect.bisect_left(keys, Prefix)
+
+        max_keys = min(MaxKeys or self.page_size, self.page_size)
+        contents = []
+        index = start
+        while index < len(keys) and len(contents) < max_keys:
+            key = keys[index]
+            if not key.startswith(Prefix):
+                break
+            size, etag, last_modified = self._stat(Bucket, key, 'ListObjectsV2')
+            contents.append({
+                'Key': key,
+                'Size': size,
+                'ETag': etag,
+                'LastModified': last_modified
+            })
+            index += 1
+
+        is_truncated = index < len(keys) and keys[index].startswith(Prefix)
+        page = {'Name': Bucket, 'Prefix': Prefix, 'KeyCount': len(contents), 'IsTruncated': is_truncated}
+        if contents:
+            page['Contents'] = contents
+        if is_truncated:
+            page['NextContinuationToken'] = contents[-1]['Key']
+        return page
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        self._request('HeadObject')
+        size, etag, last_modified = self._stat(Bucket, Key, 'HeadObject')
+        return {'ContentLength': size, 'ETag': etag, 'LastModified': last_modified}
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Return an object, honouring a single "bytes=start-end" Range header."""
+        self._request('GetObject')
+        body, etag, last_modified = self._get(Bucket, Key, 'GetObject')
+        total = len(body)
+
+        response = {'ETag': etag, 'LastModified': last_modified}
+        if Range:
+            start_text, _, end_text = Range.replace('bytes=', '', 1).partition('-')
+            if start_text:
+                start = int(start_text)
+                end = min(int(end_text), total - 1) if end_text else total - 1
+            else:
+                start, end = max(0, total - int(end_text)), total - 1
+            if start >= total:
+                raise self._error('InvalidRange', 'The requested range is not satisfiable', 416, 'GetObject')
+            body = body[start:end + 1]
+            response['ContentRange'] = f"bytes {start}-{end}/{total}"
+
+        response['Body'] = FakeStreamingBody(body)
+        response['ContentLength'] = len(body)
+        return response
+
+    def generate_presigned_url(self, ClientMethod: str, Params: Dict[str, Any], ExpiresIn: int = 3600) -> str:
+        """Return a deterministic fake presigned URL (no request is counted)."""
+        if self.root_dir:
+            return 'file://' + os.path.join(os.path.abspath(self._bucket_path(Params['Bucket'])), *Params['Key'].split('/'))
+        return (f"https://{Params['Bucket']}.s3.{self.region}.amazonaws.com/{quote(Params['Key'], safe='/~')}"
+                f"?X-Amz-Expires={ExpiresIn}&X-Amz-Signature=fake")
+
+
+class AdaptiveConcurrencyController:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on in-flight S3 requests.
+
+    Each successful request raises the limit by 1/limit, i.e. by roughly one slot per
+    round of requests. A throttling error halves the limit, at most once per
+    decrease_cooldown seconds so a burst of SlowDowns from one round only counts once.
+    Throttled requests are retried after a full-jitter exponential backoff. Transient
+    failures (the errors botocore's standard retry mode retries) are retried the same
+    way, up to transient_attempts times, but do not lower the limit.
+    """
+
+    # Error codes S3 and other AWS services use to ask clients to slow down
+    THROTTLE_ERROR_CODES = {
+        'SlowDown', 'Throttling', 'ThrottlingException', 'ThrottledException',
+        'RequestLimitExceeded', 'RequestThrottled', 'TooManyRequests',
+        'TooManyRequestsException', 'ProvisionedThroughputExceededException', '503'
+    }
+
+    # Transient failures retried by botocore's standard retry mode
+    TRANSIENT_ERROR_CODES = {'RequestTimeout', 'RequestTimeoutException', 'PriorRequestNotComplete', 'InternalError'}
+    TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 decrease_factor: float = 0.5, decrease_cooldown: float = 0.5,
+                 max_attempts: int = 10, transient_attempts: int = 3,
+                 base_delay: float = 0.1, max_delay: float = 20.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.max_attempts = max(1, max_attempts)
+        self.transient_attempts = max(1, transient_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._rng = random.Random()
+
+        # Counters for reporting
+        self.request_count = 0
+        self.throttle_count = 0
+        self.transient_count = 0
+        self.retry_count = 0
+
+    @classmethod
+    def is_throttle_error(cls, error: Exception) -> bool:
+        """Return True if the error is a throttling response."""
+        if not isinstance(error, ClientError):
+            return False
+        response = getattr(error, 'response', {}) or {}
+        code = str(response.get('Error', {}).get('Code', ''))
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        return code in cls.THROTTLE_ERROR_CODES or status in (429, 503)
+
+    @classmethod
+    def is_transient_error(cls, error: Exception) -> bool:
+        """Return True if the error is a transient failure worth retrying."""
+        if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+            return True
+        if not isinstance(error, ClientError):
+            return False
+        response = getattr(error, 'response', {}) or {}
+        code = str(response.get('Error', {}).get('Code', ''))
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        return code in cls.TRANSIENT_ERROR_CODES or status in cls.TRANSIENT_STATUS_CODES
+
+    def _acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+            self.request_count += 1
+
+    def _release(self, throttled: bool, succeeded: bool, transient: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if transient:
+                self.transient_count += 1
+            if throttled:
+                self.throttle_count += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif succeeded:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt (0-based)."""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, *args, **kwargs):
+        """Call func under the concurrency limit, retrying throttled and transient failures with backoff."""
+        transient_failures = 0
+        for attempt in range(self.max_attempts):
+            self._acquire()
+            throttled = False
+            transient = False
+            succeeded = False
+            try:
+                result = func(*args, **kwargs)
+                succeeded = True
+                return result
+            except (ClientError, BotocoreConnectionError, HTTPClientError) as e:
+                throttled = self.is_throttle_error(e)
+                transient = not throttled and self.is_transient_error(e)
+                if transient:
+                    transient_failures += 1
+                if (not (throttled or transient) or attempt == self.max_attempts - 1
+                        or transient_failures >= self.transient_attempts):
+                    raise
+            finally:
+                self._release(throttled, succeeded, transient)
+
+            self.retry_count += 1
+            time.sleep(self.backoff_delay(attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current limit and request counters."""
+        return {
+            'limit': round(self.limit, 2),
+            'requests': self.request_count,
+            'throttled': self.throttle_count,
+            'transient_errors': self.transient_count,
+            'retries': self.retry_count
+        }
+
+
+class AdaptiveS3Paginator:
+    """list_objects_v2 paginator whose page requests go through an AdaptiveS3Client."""
+
+    def __init__(self, client: 'AdaptiveS3Client'):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        params = dict(kwargs)
+        while True:
+            page = self.client.list_objects_v2(**params)
+            yield page
+            if not page.get('IsTruncated'):
+                break
+            params['ContinuationToken'] = page['NextContinuationToken']
+
+
+class AdaptiveS3Client:
+    """
+    Wraps an S3 client (real or stand-in) so that listing, HEAD and GET requests run
+    under an AdaptiveConcurrencyController. Everything else is passed through.
+    """
+
+    def __init__(self, client, controller: Optional[AdaptiveConcurrencyController] = None):
+        self.client = client
+        self.controller = controller or AdaptiveConcurrencyController()
+
+    def list_objects_v2(self, **kwargs) -> Dict[str, Any]:
+        return self.controller.call(self.client.list_objects_v2, **kwargs)
+
+    def head_object(self, **kwargs) -> Dict[str, Any]:
+        return self.controller.call(self.client.head_object, **kwargs)
+
+    def get_object(self, **kwargs) -> Dict[str, Any]:
+        return self.controller.call(self.client.get_object, **kwargs)
+
+    def get_paginator(self, operation_name: str):
+        if operation_name == 'list_objects_v2':
+            return AdaptiveS3Paginator(self)
+        return self.client.get_paginator(operation_name)
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+
+def parse_backend_spec(spec: str) -> Tuple[str, str, Dict[str, str]]:
+    """Split a backend spec like "local:/mirror?latency=0.01" into (name, location, options)."""
+    spec, _, query = spec.partition('?')
+    name, _, location = spec.partition(':')
+    return name, location, dict(parse_qsl(query))
+
+
+def create_s3_client(backend: str = 's3', region: str = 'eu-north-1',
+                     aws_access_key: Optional[str] = None, aws_secret_key: Optional[str] = None,
+                     config=None, session=None, max_concurrency: Optional[int] = None):
+    """
+    Create an S3 client for the given backend spec (see the module docstring).
+    For the real 's3' backend, an existing boto3 session can be passed in.
+
+    If max_concurrency is given, the client is wrapped in an AdaptiveS3Client whose
+    AIMD limit can grow up to max_concurrency in-flight requests.
+    """
+    client = _create_backend_client(backend, region, aws_access_key, aws_secret_key,
+                                     config, session, adaptive=max_concurrency is not None)
+    if max_concurrency is None:
+        return client
+
+    controller = AdaptiveConcurrencyController(
+        initial_limit=min(8, max_concurrency),
+        max_limit=max_concurrency
+    )
+    return AdaptiveS3Client(client, controller)
+
+
+def _create_backend_client(backend: str, region: str, aws_access_key: Optional[str],
+                           aws_secret_key: Optional[str], config, session, adaptive: bool):
+    """Create the raw client for a backend spec."""
+    name, location, options = parse_backend_spec(backend or 's3')
+
+    if name == 's3':
+        if session is None:
+            session = boto3.session.Session(
+                region_name=region,
+                aws_access_key_id=aws_access_key,
+                aws_secret_access_key=aws_secret_key
+            )
+        if adaptive:
+            # The adaptive controller does the retrying and needs to see every SlowDown.
+            # total_max_attempts counts the first attempt (max_attempts counts retries).
+            no_retries = Config(retries={'mode': 'standard', 'total_max_attempts': 1})
+            config = config.merge(no_retries) if config is not None else no_retries
+        return session.client('s3', config=config) if config is not None else session.client('s3')
+
+    if name not in ('memory', 'local'):
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if name == 'local' and not location:
+        raise ValueError("The local storage backend needs a directory, e.g. local:/path/to/mirror")
+
+    client = FakeS3Client(
+        root_dir=location if name == 'local' else None,
+        latency=float(options.get('latency', 0.0)),
+        jitter=float(options.get('jitter', 0.0)),
+        throttle_rate=float(options.get('throttle', 0.0)),
+        max_rps=float(options['max_rps']) if 'max_rps' in options else None,
+        page_size=int(options.get('page_size', 1000)),
+        region=region
+    )
+    if name == 'memory' and 'synthetic' in options:
+        client.add_synthetic_objects(options.get('bucket', DEFAULT_BUCKET), int(options['synthetic']))
+    return client
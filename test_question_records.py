@@ -0,0 +1,89 @@
+"""
+Equivalence checks for the bulk question record path
+
+build_question_records_bulk must return exactly what process_s3_file builds one
+name at a time (build_question_record on the basename of every image key), so bucket
+runs give the same records with and without --bulk. These checks compare both paths
+on hand-picked edge cases and on seeded random names.
+
+Usage:
+    python -m pytest -q test_question_records.py
+"""
+
+import os
+import random
+
+import pytest
+
+from s3_question_generator import ESLQuestionGenerator
+
+
+@pytest.fixture(scope='module')
+def generator():
+    # No request is made, so the S3 client is never created
+    return ESLQuestionGenerator(include_urls=False)
+
+
+def scalar_records(generator, keys):
+    return [(key, generator.build_question_record(os.path.basename(key)))
+            for key in keys if generator.is_image_file(key)]
+
+
+def assert_equivalent(generator, keys):
+    bulk = generator.build_question_records_bulk(keys)
+    scalar = scalar_records(generator, keys)
+    assert len(bulk) == len(scalar)
+    for (bulk_key, bulk_record), (scalar_key, scalar_record) in zip(bulk, scalar):
+        assert (bulk_key, bulk_record) == (scalar_key, scalar_record), scalar_key
+
+
+EDGE_CASE_NAMES = [
+    # Numeric prefixes, with and without a second letter group
+    '01 A is it a cat.png', '05 C B do you like apples.jpg', '1 AB can you swim.gif',
+    '01_A_is_it_a_cat.png', '14_DE_what is this.webp', '100_A_is_it_a_cat.png',
+    '01_a_lowercase letter.png', '01 A.png', '01_A_.png', '01  A  two spaces.png',
+    # Separators and whitespace runs
+    'is_it-a__cat.png', '__is it a cat__.png', '-do you swim-.jpeg', '  padded  .png',
+    'tab\there.png', 'nbsp\u00a0here.png', 'em\u2003space.png', 'mixed \u00a0\t runs.png',
+    'line\u2028sep.png', 'ideographic\u3000space.png',
+    # Question marks, empty and odd stems
+    'are they happy?.png', 'what is this??.png', '.png', '_.png', ' .png', '?.png',
+    'x.png', '\u00c4PFEL essen.png', '\u00dftra\u00dfe.png', '\u01c6 title.png',
+    # Extensions and leading dots
+    'UPPER CASE.PNG', 'double.ext.jpg', 'noext', 'readme.txt', 'archive.png.zip',
+    '.hidden.png', '..dots.png', '.png.png', 'trailing dot.', 'image.JpEg',
+    # Keys with directories
+    'book1/unit2/01_A_is_it_a_cat.png', 'book1/unit2/', 'book1/.png', 'a/b/c/where is it.bmp',
+]
+
+
+def test_edge_case_names(generator):
+    assert_equivalent(generator, EDGE_CASE_NAMES)
+
+
+def test_question_pattern_openings(generator):
+    openings = [pattern.lstrip('^') for pattern in
+                [*ESLQuestionGenerator.QUESTION_PATTERNS, *ESLQuestionGenerator.SPECIAL_QUESTION_PATTERNS]]
+    keys = []
+    for opening in openings:
+        words = opening.replace(' ', '_')
+        keys += [f'01_A_{words}_like_apples.png', f'02 B {opening.upper()} run.jpg',
+                 f'{opening}.png', f'{opening}s.png', f'x {opening}.png']
+    assert_equivalent(generator, keys)
+
+
+def test_newline_in_name_uses_scalar_path(generator):
+    assert_equivalent(generator, ['01_A_is it\na cat.png', 'book1/is it a dog.png'])
+
+
+def test_random_names(generator):
+    rng = random.Random(12)
+    fragments = ['01', '1', '100', 'A', 'AB', 'a', 'is', 'it', 'do', 'you', 'what', 'Where', 'CAN',
+                 '_', '-', ' ', '  ', '\t', '\u00a0', '\u2003', '?', '.', '\u00e9', '\u00df', '\x85']
+    extensions = ['.png', '.PNG', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.txt', '']
+    keys = []
+    for _ in range(20000):
+        stem = ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 8)))
+        directory = rng.choice(['', 'book1/', 'book2/unit3/'])
+        keys.append(f'{directory}{stem}{rng.choice(extensions)}')
+    assert_equivalent(generator, keys)
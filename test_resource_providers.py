@@ -0,0 +1,69 @@
+"""
+Checks for the link provider registry
+
+The id helpers must keep accepting every link form the per-provider regexes in
+parse_docx_resources_fixed.py accepted before the registry, while the scanner
+only reports complete iframes.
+
+Usage:
+    python -m pytest -q test_resource_providers.py
+"""
+
+import pytest
+
+from parse_docx_resources_fixed import extract_isl_collective_id, extract_wordwall_id, extract_youtube_id
+from resource_providers import EMBED, URL, scan_embeds, scan_links
+
+YOUTUBE_ID = 'abcdefghijk'
+
+
+@pytest.mark.parametrize('text', [
+    f'<iframe width="560" src="https://www.youtube.com/embed/{YOUTUBE_ID}" frameborder="0"></iframe>',
+    f'src="https://www.youtube.com/embed/{YOUTUBE_ID}"',
+    f'src="http://www.youtube.com/embed/{YOUTUBE_ID}?rel=0"',
+    f'src="https://youtube.com/embed/{YOUTUBE_ID}"',
+    f'https://www.youtube.com/watch?v={YOUTUBE_ID}&t=30',
+    f'https://youtu.be/{YOUTUBE_ID}',
+    f'https://www.youtube.com/watch?feature=share&v={YOUTUBE_ID}',
+])
+def test_youtube_link_forms(text):
+    assert extract_youtube_id(text) == YOUTUBE_ID
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('src="https://www.wordwall.net/embed/abcd123"', 'abcd123'),
+    ('<iframe src="https://wordwall.net/embed/ff00aa?themeId=1" width="500"></iframe>', 'ff00aa'),
+    ('src="http://wordwall.net/resource/9876"', '9876'),
+    ('https://wordwall.net/resource/12345/animals', '12345'),
+])
+def test_wordwall_link_forms(text, expected):
+    assert extract_wordwall_id(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'src="https://islcollective.com/a/b/c/777"',
+    'src="https://en.islcollective.com/english-esl-video-lessons/embed/777"',
+    'https://en.islcollective.com/english-esl-video-lessons/farm-animals/777',
+])
+def test_isl_collective_link_forms(text):
+    assert extract_isl_collective_id(text) == '777'
+
+
+def test_no_link():
+    for extract in (extract_youtube_id, extract_wordwall_id, extract_isl_collective_id):
+        assert extract('VIDEO Farm animals') is None
+
+
+def test_scanner_reports_only_complete_iframes():
+    text = (f'<iframe src="https://www.youtube.com/embed/{YOUTUBE_ID}"></iframe> '
+            'src="https://www.wordwall.net/embed/abcd123" '
+            '<iframe src="https://wordwall.net/embed/ff00aa"></iframe>')
+    assert [(link.provider.name, link.id) for link in scan_embeds(text)] == [
+        ('youtube', YOUTUBE_ID), ('wordwall', 'ff00aa')]
+    assert all(link.kind == EMBED for link in scan_embeds(text))
+
+
+def test_scanner_reports_bare_urls():
+    links = list(scan_links(f'Watch https://youtu.be/{YOUTUBE_ID} or play wordwall.net/resource/12345'))
+    assert [(link.provider.name, link.kind, link.id) for link in links] == [
+        ('youtube', URL, YOUTUBE_ID), ('wordwall', URL, '12345')]